@@ -1,8 +1,13 @@
 from new_Encoder_breakdown_rules import *
-import pddlpy
-from parseR.tools import parse_pddl
+from parseR.tools import parse_pddl, parse_problem
 from collections import defaultdict
-from z3 import *
+from itertools import chain
+import logging
+import sys
+from planner import decode_plan
+from preprocess import preprocess
+from solvers import DimacsWriter, make_backend
+from split_encoding import SplitEncoding
 
 
 
@@ -11,39 +16,86 @@ def main():
 	path_domain1 = './original_domain.pddl'
 	path_instance = './prob4.pddl'
 	h = 6 #Horizon
-
-
-	task1 = parse_pddl(path_domain1,path_instance)
-	domprob = pddlpy.DomainProblem(path_domain1,path_instance)
-
-	#Construct formulae for given planning problem:
-	F1_kb1 = goal_state(task1, h,)
-
-	F2_kb1 = init_states(task1)
-
-	F3_kb1 = Preconditons(task1,domprob, h)
-
-	F4_kb1 = Add_Effects(task1, domprob, h)
-
-	F5_kb1 = Frames_addeff(task1, domprob, h)
-
-	F6_kb1 = Del_Effects(task1, domprob, h)
-
-	F7_kb1 = Frames_deleff(task1, domprob, h)
-
-	F8_kb1 =  exclusion_axioms(task1, h)
-
-
-	F_1 = [F1_kb1, F2_kb1, F3_kb1, F4_kb1, F5_kb1, F6_kb1, F7_kb1, F8_kb1]
-	F_1 = [item for sublist in F_1 for item in sublist]
-	KB = list(set(F_1))
-	
-	with open('KB.txt', 'w') as the_file:
-		for k in KB:
-			the_file.write(str(k)+' ')
+	forward = True #Ground only the operators reachable from the initial state, ignoring deletes
+	template = False #Build the transition relation for one step and shift it to every other step (slower in pure Python)
+	exclusion = 'sequential' #At-most-one encoding of the action exclusion axioms, see AMO_ENCODINGS
+	semantics = 'sequential' #'forall' / 'exists' let non-interfering actions share a step instead
+	workers = 1 #Processes that ground the actions (not with forward) and encode the timesteps when template is off
+	reachable = True #Fix the facts and actions the planning graph cannot reach by step t to false
+	mutexes = True #With reachable, also add the fact mutexes of the planning graph as binary clauses (not with 'exists')
+	relevant = True #Leave out the facts and actions that cannot contribute to the goal in the steps left
+	split = False #Lifted encoding of split_encoding.py instead (sequential steps, none of the options above)
+	dedup = 'store' #Drop every duplicate clause; 'window' only checks recent clauses, so memory stays flat with the horizon
+	simplify = True #Unit propagation and subsumption over the whole KB before it is written (holds the whole KB)
+	cache = '.task_cache' #Directory of grounded tasks to reuse across runs (parseR/cache.py); None to always ground
+	solver = 'auto' #SAT backend for the KB, see solvers.available_backends(); None to only write it
+
+
+	steps = () #Flat clause buffers of the encoding workers, see parallel_steps
+	if split:
+		#Operator splitting: one variable per action schema and per argument, the actions are never grounded:
+		encoding = SplitEncoding(parse_problem(path_domain1, path_instance), h, exclusion)
+		vt = encoding.vt
+		clauses = chain(encoding.goal_state(), encoding.init_state(), unrolled_steps(encoding.step_template(), vt, h))
+		decode = encoding.decode_plan
+	else:
+		task1 = parse_pddl(path_domain1,path_instance,forward,workers,cache)
+
+		#The grounded task is the single source; every stage shares the catalogue and variable ids:
+		catalogue = task_catalogue(task1)
+		interference = None if semantics == 'sequential' else interference_pairs(catalogue, semantics)
+		if interference is None:
+			#Size of every at-most-one encoding for this many actions, to pick `exclusion` by:
+			amo_report(len(catalogue))
+		vt = make_var_table(task1, catalogue, h, exclusion if interference is None else 'pairwise')
+		index = effect_index(catalogue, vt)
+		#The graph mutexes assume forall steps: under 'exists' two of them may hold after one step
+		reach = Reachability(task1, vt, mutexes and semantics != 'exists') if reachable else None
+		relevance = Relevance(task1, catalogue, index, vt, reach) if relevant else None
+
+		#Construct formulae for given planning problem, one generator per axiom family:
+		families = [goal_state(task1, h, vt), init_states(task1, vt)]
+
+		if template:
+			families.append(unrolled_steps(step_template(task1, catalogue, index, vt, exclusion, interference), vt, h))
+		elif workers > 1:
+			#The workers also prune their steps, so they skip the pruning below:
+			steps = parallel_steps(task1, catalogue, index, h, vt, exclusion, interference, workers,
+								   [p for p in (reach, relevance) if p])
+		else:
+			families.append(transition_clauses(task1, catalogue, index, vt, h, exclusion, interference))
+
+		clauses = chain(*families)
+		if reach:
+			clauses = chain(reach.prune(clauses), reach.units(h), reach.mutex_clauses(h))
+		if relevance:
+			clauses = chain(relevance.prune(clauses), relevance.units())
+		decode = lambda model: decode_plan(vt, model, h)
+
+	#Drop duplicates as they are generated, exactly in the clause store or within a bounded
+	#window of recent clauses:
+	if dedup == 'store':
+		store = ClauseStore()
+		clauses = chain(store.filter(clauses), chain.from_iterable(map(store.filter_buffer, steps)))
+	else:
+		clauses = dedup_window(chain(clauses, chain.from_iterable(map(iter_clauses, steps))))
+	if simplify:
+		#Needs the whole KB, so nothing is written before it is complete:
+		clauses, report = preprocess(clauses)
+
+	#Write KB.txt and KB.cnf and fill the solver in one pass, as the clauses arrive:
+	backend = make_backend(solver) if solver else None
+	with DimacsWriter('KB.cnf', vt.num_vars()) as cnf:
+		write_kb(clauses, 'KB.txt', vt, sinks=[cnf] + ([backend] if backend else []))
+
+	if backend:
+		if backend.solve():
+			for t, name in decode(backend.model()):
+				print(t, name)
+		else:
+			print('No plan of length {0} ({1})'.format(h, backend.name))
 
 if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s',
+						stream=sys.stdout)
 	main()
-
-
-
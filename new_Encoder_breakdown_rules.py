@@ -1,46 +1,19 @@
+import os
 import sys
-import z3
-sys.path.append('/Users/thestlucas/Desktop/ProbLogic/parseR/')
-
-from itertools import combinations
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parseR'))
+
+from array import array
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, count
+import logging
+import math
+import multiprocessing
 import re
 
-########################################################################################################################
-
-def get_predicates_pddlpy(domprob):
-	predicates = []
-	for op in domprob.operators():
-		for o in domprob.ground_operator(op):
-			for i in list(o.precondition_pos):
-				# s = "_"
-				#
-				# s = s.join(i)
-				predicates.append(i[0])
-	for op in domprob.operators():
-		for o in domprob.ground_operator(op):
-			for i in list(o.effect_pos):
-				predicates.append(i[0])
-	for op in domprob.operators():
-		for o in domprob.ground_operator(op):
-			for i in list(o.effect_neg):
-				predicates.append(i[0])
-
-
-	predicates = list(set(predicates))
-
-	for v in predicates:
-		v = str(v).lower()
-		v = re.sub('[\\{\}<>-_()]', ' ', v)
-		v = v.replace('-', '')
-		v = v.strip()
-		v = v[:v.find(" ")]
-	return predicates
-
-
-
-def convert_to_symbols(sentence):
-	return '_'.join(sentence).upper()
+from planning_graph import PlanningGraph
 
+########################################################################################################################
 
 def convert_to_symbolic(x):
 
@@ -55,273 +28,686 @@ def convert_to_symbolic(x):
 	return x
 
 
-def make_successor_symbols(symbs, t):
-	symbs = [str(i) for i in symbs]
-	dct = {}
-	for i in range(t):
-		dct[i] = [item + '_{}'.format(i) for item in symbs]
-	return dct
-
-def init_states(task):
-	init = list(task.initial_state)
-	symbs_init = []
-	for i in init:
-		symbs_init.append(convert_to_symbolic(i))
-
-	Init = make_successor_symbols(symbs_init, 1)[0]
-
-	facts = list(task.facts)
-	facts = [re.sub('[\(\)\{\}<>-]', '', facts[i]).upper() for i in range(len(list(facts))) ]
-	symbs_facts = []
-	for i in facts:
-		symbs_facts.append(convert_to_symbolic(i))
-
-	Facts = make_successor_symbols(symbs_facts, 1)[0]
-	Facts = [convert_to_symbolic(j) for j in Facts]
-
-
-	initial_conds = []
-	for i in Facts:
-		if i not in Init:
-			initial_conds.append(z3.Not(z3.Bool(str(i))))
-	for i in Init:
-		initial_conds.append(z3.Bool(str(i)))
-	return initial_conds
-
-
-
-def goal_state(task, t):
-	goal = list(task.goals)
-	symbs_goal = []
-	for i in goal:
-		symbs_goal.append(convert_to_symbolic(i))
-
-	Goal = make_successor_symbols(symbs_goal, t+1)[t]
-	Goal = [z3.Bool(str(convert_to_symbolic(j))) for j in Goal]
-	return Goal
-
-
-
-
-
-
-def Preconditons(task,domprob, horizon):
-
-	def action_preconditions(task, t):
-
-		for op in task.operators:
-			preconds_temp = [convert_to_symbolic(i) for i in list(op.preconditions)]
-			if preconds_temp:
-				for p in preconds_temp:
-					yield z3.Implies(z3.Bool(str(make_successor_symbols([convert_to_symbolic(op.name)],t)[t-1][0])), z3.And([z3.Bool(str(z)) for z in make_successor_symbols([p],t)[t-1]]))
-			# elif not preconds_temp:
-			#     yield z3.Implies(z3.Bool(str(make_successor_symbols([convert_to_symbolic(op.name)],t)[t-1][0])), z3.Bool('True'))
-
-		if not preconds_temp:
-
-			for op in list( domprob.operators()):
-				for i in list(domprob.ground_operator(op))[0].precondition_pos:
-
-					element = next(iter(i))
-					element, = element
-
-					preconds_temp2 = [convert_to_symbolic(element)]
-					if preconds_temp2:
-						for p in preconds_temp2:
-							yield z3.Implies(
-								z3.Bool(str(make_successor_symbols([convert_to_symbolic(op)], t)[t - 1][0])),
-								z3.And([z3.Bool(str(z)) for z in make_successor_symbols([p], t)[t - 1]]))
-
+class VarTable:
+	"""Dense integer ids for every (fact, t) and (action, t) pair up to a horizon.
 
-	pres = []
-	for i in range(horizon):
-		pres.append(list(action_preconditions(task, i+1)))
-	pres = [item for sublist in pres for item in sublist]
+	Step t owns the id block [t*stride + 1, (t+1)*stride]: facts, then actions,
+	then `aux` auxiliary variables of the step's encodings. Ids never depend on
+	the horizon itself. Facts exist for t in 0..horizon, actions and auxiliaries
+	for t in 0..horizon-1. Negative integers are negated literals, as in DIMACS.
+	"""
 
-	return pres
+	def __init__(self, facts, actions, horizon, aux=0):
+		self.facts = list(facts)
+		self.actions = list(actions)
+		self.horizon = horizon
+		self.aux = aux
+		self.fact_index = {f: i for i, f in enumerate(self.facts)}
+		self.action_index = {a: i for i, a in enumerate(self.actions)}
+		self.stride = len(self.facts) + len(self.actions) + aux
 
-def Add_Effects(task, domprob, horizon):
+	def fact(self, symbol, t):
+		return t * self.stride + self.fact_index[symbol] + 1
 
-	def action_effects(task, t):
-		#
-		# for op in task.operators:
-		# 	effects_temp = [convert_to_symbolic(i) for i in list(op.add_effects)]
-		# 	if effects_temp:
-		# 		for e in effects_temp:
-		# 			yield z3.Implies(z3.Bool(str(make_successor_symbols([convert_to_symbolic(op.name)],t)[t-1][0])), z3.And([z3.Bool(str(z)) for z in make_successor_symbols([e],t+1)[t]]))
-	#             elif not effects_temp:
-	#                 yield z3.Implies(z3.Bool(str(make_successor_symbols([convert_to_symbolic(op.name)],t)[t-1][0])), z3.Bool('True'))
+	def action(self, symbol, t):
+		return t * self.stride + len(self.facts) + self.action_index[symbol] + 1
 
-		for op in list(domprob.operators()):
-			effects_temp = []
-			for i in list(domprob.ground_operator(op)):
-				if not all(elem == list(i.variable_list.values())[0] for elem in list(i.variable_list.values())):
-					tem = '_'.join(list(i.variable_list.values()))
-					names = str(op).upper() + '_' + tem
-					effects_temp = ['_'.join(j).upper() for j in list(i.effect_pos)]
+	def fact_var(self, index, t):
+		return t * self.stride + index + 1
 
-				if effects_temp:
-					for e in effects_temp:
-						yield z3.Implies(
-							z3.Bool(str(make_successor_symbols([convert_to_symbolic(names)], t)[t - 1][0])),
-							z3.And([z3.Bool(str(z)) for z in make_successor_symbols([e], t + 1)[t]]))
+	def action_var(self, index, t):
+		return t * self.stride + len(self.facts) + index + 1
 
+	def aux_var(self, index, t):
+		assert index < self.aux, 'step needs more auxiliary variables than reserved'
+		return t * self.stride + len(self.facts) + len(self.actions) + index + 1
 
-	effs = []
-	for i in range(horizon):
-		effs.append(list(action_effects(task, i+1)))
+	def aux_allocator(self, t):
+		"""Return a fresh() callable handing out the auxiliary variables of step t in order."""
+		counter = iter(range(self.aux + 1))
+		return lambda: self.aux_var(next(counter), t)
 
+	def num_vars(self):
+		return self.horizon * self.stride + len(self.facts)
 
+	def decode(self, var):
+		"""Reverse map: return (symbol, t, is_action) for a variable id."""
+		t, i = divmod(abs(var) - 1, self.stride)
+		if i < len(self.facts):
+			return self.facts[i], t, False
+		i -= len(self.facts)
+		if i < len(self.actions):
+			return self.actions[i], t, True
+		return 'AUX{}'.format(i - len(self.actions)), t, False
 
-	effs = [item for sublist in effs for item in sublist]
+	def name(self, var):
+		symbol, t, _ = self.decode(var)
+		return '{}_{}'.format(symbol, t)
 
-	return effs
+	def text(self, clause):
+		"""Render a clause in the z3 syntax of KB.txt without building any z3 term."""
+		lits = [self.name(l) if l > 0 else 'Not({})'.format(self.name(l)) for l in clause]
+		if not lits:
+			return 'False'
+		return lits[0] if len(lits) == 1 else 'Or({})'.format(', '.join(lits))
 
 
+GroundOperator = namedtuple('GroundOperator', ['name', 'preconditions', 'add_effects', 'del_effects'])
 
-def Del_Effects(task, domprob, horizon):
 
-	def action_effects(task, t):
+def task_catalogue(task):
+	"""Name, precondition, add and delete lists of every operator of the grounded task, as symbols.
 
-	# 	for op in task.operators:
-	# 		effects_temp = [z3.Bool(convert_to_symbolic(i)) for i in list(op.del_effects)]
-	# 		if effects_temp:
-	# 			for e in effects_temp:
-	# 				yield z3.Implies(z3.Bool(str(make_successor_symbols([convert_to_symbolic(op.name)],t)[t-1][0])), z3.And([z3.Not(z3.Bool(z)) for z in make_successor_symbols([e],t+1)[t]]))
-	# #             elif not effects_temp:
-	#                 yield z3.Implies(z3.Bool(str(make_successor_symbols([convert_to_symbolic(op.name)],t)[t-1][0])), z3.Bool('True'))
+	The task is the only source of the encoding: its operators are already
+	stripped of static preconditions and pruned by the relevance analysis.
+	"""
+	def symbols(facts):
+		return tuple(sorted(convert_to_symbolic(i) for i in facts))
 
-		for op in list(domprob.operators()):
-			effects_temp = []
-			for i in list(domprob.ground_operator(op)):
-				if not all(elem == list(i.variable_list.values())[0] for elem in list(i.variable_list.values())):
+	return sorted(GroundOperator(convert_to_symbolic(op.name), symbols(op.preconditions),
+								 symbols(op.add_effects), symbols(op.del_effects))
+				  for op in task.operators)
 
-					tem = '_'.join(list(i.variable_list.values()))
-					names = str(op).upper() + '_' + tem
-					effects_temp = ['_'.join(j).upper() for j in list(i.effect_neg)]
 
-				if effects_temp:
-					for e in effects_temp:
-						yield z3.Implies(z3.Bool(str(make_successor_symbols([convert_to_symbolic(names)],t)[t-1][0])),
-										 z3.And([z3.Not(z3.Bool(z)) for z in make_successor_symbols([e],t+1)[t]]))
-
-
-	effs = []
-	for i in range(horizon):
-		effs.append(list(action_effects(task, i+1)))
+def make_var_table(task, catalogue, horizon, exclusion='pairwise'):
+	facts = sorted(convert_to_symbolic(i) for i in task.facts)
+	known_facts = set(facts)
+	for op in catalogue:
+		for fact in op.preconditions + op.add_effects + op.del_effects:
+			if fact not in known_facts:
+				known_facts.add(fact)
+				facts.append(fact)
+	aux = amo_size(exclusion, len(catalogue))[1]
+	return VarTable(facts, [op.name for op in catalogue], horizon, aux)
 
 
+########################################################################################################################
+# At-most-one encodings for the action exclusion axioms. Each one is a generator of clauses over
+# `lits`; `fresh()` returns a new auxiliary variable id every time it is called.
+
+def amo_pairwise(lits, fresh):
+	for a, b in combinations(lits, 2):
+		yield [-a, -b]
+
+
+def amo_sequential(lits, fresh):
+	"""Sinz' sequential counter: 3n-4 clauses, n-1 auxiliaries."""
+	if len(lits) < 2:
+		return
+	prev = fresh()
+	yield [-lits[0], prev]
+	for x in lits[1:-1]:
+		s = fresh()
+		yield [-x, s]
+		yield [-prev, s]
+		yield [-x, -prev]
+		prev = s
+	yield [-lits[-1], -prev]
+
+
+def amo_commander(lits, fresh, group=3):
+	"""Klieber and Kwon: pairwise inside groups, each group implies its commander, recurse on commanders."""
+	if len(lits) <= group + 1:
+		for clause in amo_pairwise(lits, fresh):
+			yield clause
+		return
+	commanders = []
+	for i in range(0, len(lits), group):
+		members = lits[i:i + group]
+		for clause in amo_pairwise(members, fresh):
+			yield clause
+		c = fresh()
+		commanders.append(c)
+		for x in members:
+			yield [-x, c]
+	for clause in amo_commander(commanders, fresh, group):
+		yield clause
+
+
+def amo_product(lits, fresh):
+	"""Chen's product encoding: place lits on a p x q grid, recurse on the row and column variables."""
+	if len(lits) <= 4:
+		for clause in amo_pairwise(lits, fresh):
+			yield clause
+		return
+	p = int(math.ceil(math.sqrt(len(lits))))
+	q = int(math.ceil(len(lits) / float(p)))
+	rows = [fresh() for _ in range(p)]
+	cols = [fresh() for _ in range(q)]
+	for k, x in enumerate(lits):
+		yield [-x, rows[k // q]]
+		yield [-x, cols[k % q]]
+	for clause in amo_product(rows, fresh):
+		yield clause
+	for clause in amo_product(cols, fresh):
+		yield clause
+
+
+def _binary_code(lits, bits, fresh):
+	# Every literal implies the bit pattern of its position, so no two can be true together.
+	code = [fresh() for _ in range(bits)]
+	for k, group in enumerate(lits):
+		for x in group:
+			for b in range(bits):
+				yield [-x, code[b] if (k >> b) & 1 else -code[b]]
+
+
+def amo_binary(lits, fresh):
+	"""Frisch's binary (log) encoding: n*log2(n) clauses, log2(n) auxiliaries."""
+	if len(lits) < 2:
+		return
+	bits = (len(lits) - 1).bit_length()
+	for clause in _binary_code([[x] for x in lits], bits, fresh):
+		yield clause
+
+
+def amo_bimander(lits, fresh, groups=None):
+	"""Nguyen and Mai: pairwise inside `groups` groups (n/2 by default), binary code over the group index."""
+	if len(lits) < 2:
+		return
+	groups = groups or int(math.ceil(len(lits) / 2.0))
+	size = int(math.ceil(len(lits) / float(groups)))
+	members = [lits[i:i + size] for i in range(0, len(lits), size)]
+	for group in members:
+		for clause in amo_pairwise(group, fresh):
+			yield clause
+	bits = (len(members) - 1).bit_length()
+	for clause in _binary_code(members, bits, fresh):
+		yield clause
+
+
+AMO_ENCODINGS = {
+	'pairwise': amo_pairwise,
+	'sequential': amo_sequential,
+	'commander': amo_commander,
+	'product': amo_product,
+	'binary': amo_binary,
+	'bimander': amo_bimander,
+}
+
+
+def amo_size(encoding, n):
+	"""Return (clauses, auxiliary variables) the encoding adds for n literals."""
+	if encoding == 'pairwise':
+		return n * (n - 1) // 2, 0
+	counter = count(n + 1)
+	clauses = sum(1 for _ in AMO_ENCODINGS[encoding](list(range(1, n + 1)), lambda: next(counter)))
+	return clauses, next(counter) - n - 1
+
+
+def amo_report(n):
+	"""Log the clauses and auxiliary variables per step of every encoding for n actions."""
+	for encoding in AMO_ENCODINGS:
+		clauses, aux = amo_size(encoding, n)
+		logging.info('{0:>10}: {1} clauses, {2} auxiliary variables per step ({3} actions)'.format(
+			encoding, clauses, aux, n))
+
+
+def interference_pairs(catalogue, semantics='forall'):
+	"""Pairs (a, b), a < b, of catalogue positions that may not be executed in the same step.
+
+	'forall': either action deletes a precondition or an add effect of the
+	other, so every order of the step is a valid plan.
+	'exists': the actions of a step are executed in catalogue order, so only an
+	earlier action deleting a precondition of a later one conflicts.
+	"""
+	needers = defaultdict(set)
+	adders = defaultdict(set)
+	for a, op in enumerate(catalogue):
+		for f in op.preconditions:
+			needers[f].add(a)
+		for f in op.add_effects:
+			adders[f].add(a)
+
+	pairs = set()
+	for a, op in enumerate(catalogue):
+		for f in op.del_effects:
+			for b in needers[f]:
+				if b != a and (semantics == 'forall' or a < b):
+					pairs.add((min(a, b), max(a, b)))
+			if semantics == 'forall':
+				for b in adders[f]:
+					if b != a:
+						pairs.add((min(a, b), max(a, b)))
+	return sorted(pairs)
+
+
+EffectIndex = namedtuple('EffectIndex', ['adders', 'deleters'])
+
+
+def effect_index(catalogue, vt):
+	"""Map every fact index of vt to the indices of the actions that add / delete it."""
+	adders = [[] for _ in vt.facts]
+	deleters = [[] for _ in vt.facts]
+	for op in catalogue:
+		a = vt.action_index[op.name]
+		for f in op.add_effects:
+			adders[vt.fact_index[f]].append(a)
+		for f in op.del_effects:
+			deleters[vt.fact_index[f]].append(a)
+	return EffectIndex(adders, deleters)
+
+
+def init_states(task, vt):
+	init = {convert_to_symbolic(i) for i in task.initial_state}
+
+	for i in sorted(convert_to_symbolic(j) for j in task.facts):
+		if i not in init:
+			yield [-vt.fact(i, 0)]
+	for i in sorted(init):
+		yield [vt.fact(i, 0)]
+
+
+
+def goal_state(task, t, vt):
+	for i in sorted(task.goals):
+		yield [vt.fact(convert_to_symbolic(i), t)]
+
+
+
+# Every axiom family below is a generator of clauses (lists of int literals), one timestep after
+# the other, so a KB can be written out while it is still being encoded. `start` skips the first
+# timesteps, so that parallel_steps can hand each worker a range of its own.
+
+def Preconditons(task, catalogue, horizon, vt, start=0):
+	for t in range(start, horizon):
+		for op in catalogue:
+			a = vt.action(op.name, t)
+			for p in op.preconditions:
+				yield [-a, vt.fact(p, t)]
+
+
+def Add_Effects(task, catalogue, horizon, vt, start=0):
+	for t in range(start, horizon):
+		for op in catalogue:
+			a = vt.action(op.name, t)
+			for e in op.add_effects:
+				yield [-a, vt.fact(e, t + 1)]
 
-	effs = [item for sublist in effs for item in sublist]
 
-	return effs
+def Del_Effects(task, catalogue, horizon, vt, start=0):
+	for t in range(start, horizon):
+		for op in catalogue:
+			a = vt.action(op.name, t)
+			for e in op.del_effects:
+				yield [-a, -vt.fact(e, t + 1)]
 
 
-def Frames_addeff(task, domprob, horizon):
-	def frames_addeff(task, t):
-		# predicates = [convert_to_symbolic(i) for i in list(task.facts)]
-		# for p in predicates:
-		# 	temp = []
-		# 	for op in task.operators:
-		# 		effects_temp = [convert_to_symbolic(i) for i in list(op.add_effects)]
-		# 		if p in effects_temp:
-		# 			temp.append(convert_to_symbolic(op.name))
-		# 	if temp:
-		# 		yield z3.Implies(z3.And(z3.Not(z3.Bool(str(make_successor_symbols([p],t)[t-1][0]))), z3.Bool(make_successor_symbols([p],t+1)[t][0])), z3.Or([z3.Bool(str(k)) for k in make_successor_symbols(temp,t)[t-1] ])   )
-	#             elif not temp:
-	#                 yield ~expr(make_successor_symbols(p,t)[t-1][0])&expr(make_successor_symbols(p,t+1)[t][0]) |'==>'| Symbol('True')
-		predicates = [convert_to_symbolic(i) for i in list(task.facts)]
+def Frames_addeff(task, index, horizon, vt, start=0):
+	predicates = sorted(vt.fact_index[convert_to_symbolic(i)] for i in task.facts)
+	for t in range(start, horizon):
 		for p in predicates:
-			temp = []
-			for op in list(domprob.operators()):
-				effects_temp = []
-				for i in list(domprob.ground_operator(op)):
-					if not all(elem == list(i.variable_list.values())[0] for elem in list(i.variable_list.values())):
-
-						tem = '_'.join(list(i.variable_list.values()))
-						names = str(op).upper() + '_' + tem
-						effects_temp = ['_'.join(j).upper() for j in list(i.effect_pos)]
-						if p in effects_temp:
-							temp.append(convert_to_symbolic(names))
-			if temp:
-				yield z3.Implies(z3.And(z3.Not(z3.Bool(str(make_successor_symbols([p],t)[t-1][0]))), z3.Bool(make_successor_symbols([p],t+1)[t][0])),
-								 z3.Or([z3.Bool(str(k)) for k in make_successor_symbols(temp,t)[t-1] ])   )
-		#
-
-
-	frames = []
-	for i in range(horizon):
-		frames.append(list(frames_addeff(task, i+1)))
-
-
+			# Also without adders: the fact then cannot become true.
+			yield [vt.fact_var(p, t), -vt.fact_var(p, t + 1)] + [vt.action_var(k, t) for k in index.adders[p]]
 
-	frames = [item for sublist in frames for item in sublist]
 
-	return frames
-
-
-def Frames_deleff(task, domprob, horizon):
-	def frames_deleff(task, t):
-		predicates = [convert_to_symbolic(i) for i in list(task.facts)]
+def Frames_deleff(task, index, horizon, vt, start=0):
+	predicates = sorted(vt.fact_index[convert_to_symbolic(i)] for i in task.facts)
+	for t in range(start, horizon):
 		for p in predicates:
-			temp = []
-			for op in list(domprob.operators()):
-				for i in list(domprob.ground_operator(op)):
-					if not all(elem == list(i.variable_list.values())[0] for elem in list(i.variable_list.values())):
-
-						tem = '_'.join(list(i.variable_list.values()))
-						names = str(op).upper() + '_' + tem
-						effects_temp = ['_'.join(j).upper() for j in list(i.effect_neg)]
-						if p in effects_temp:
-							temp.append(convert_to_symbolic(names))
-			if temp:
-				yield z3.Implies(z3.And(z3.Bool(str(make_successor_symbols([p], t)[t - 1][0])),
-										z3.Not(z3.Bool(make_successor_symbols([p], t + 1)[t][0]))),
-								 z3.Or([z3.Bool(str(k)) for k in make_successor_symbols(temp, t)[t - 1]]))
-
-	#             elif not temp:
-	#                 yield expr(make_successor_symbols(p, t)[t - 1][0]) & ~expr(make_successor_symbols(p, t + 1)[t][0]) | '==>' | Symbol('True')
-
-
-	frames = []
-	for i in range(horizon):
-		frames.append(list(frames_deleff(task, i+1)))
-
-
-
-	frames = [item for sublist in frames for item in sublist]
-
-	return frames
-
-
-def exclusion_axioms(task, t):
-	actions = []
-	axioms =  []
-	for op in task.operators:
-		actions.append(convert_to_symbolic(op.name))
-	actions = list(combinations(actions, 2))
-	for act in actions:
-		temp = make_successor_symbols(act, t)
-		for i in temp:
-			axioms.append(temp[i])
-	for i in range(len(axioms)):
-		axioms[i] = [z3.Bool(convert_to_symbolic(j)) for j in axioms[i]]
-		axioms[i] = [z3.Or(z3.Not(axioms[i][0]) , z3.Not(axioms[i][1]))]
-
-	axioms = [item for sublist in axioms for item in sublist]
-
-	return axioms
-
-
-
-
-
-
+			# Also without deleters: the fact then cannot become false.
+			yield [-vt.fact_var(p, t), vt.fact_var(p, t + 1)] + [vt.action_var(k, t) for k in index.deleters[p]]
+
+
+def exclusion_axioms(task, t, vt, encoding='pairwise', interference=None, start=0):
+	if interference is not None:
+		# Parallel steps: only the interfering pairs are mutually exclusive.
+		for i in range(start, t):
+			for a, b in interference:
+				yield [-vt.action_var(a, i), -vt.action_var(b, i)]
+		return
+
+	amo = AMO_ENCODINGS[encoding]
+	for i in range(start, t):
+		actions = [vt.action_var(a, i) for a in range(len(vt.actions))]
+		for clause in amo(actions, vt.aux_allocator(i)):
+			yield clause
+
+
+def transition_clauses(task, catalogue, index, vt, horizon, exclusion='pairwise', interference=None, start=0):
+	"""Every per-step family of the steps start..horizon-1, one step after the other."""
+	for t in range(start, horizon):
+		families = [Preconditons(task, catalogue, t + 1, vt, t),
+					Add_Effects(task, catalogue, t + 1, vt, t),
+					Frames_addeff(task, index, t + 1, vt, t),
+					Del_Effects(task, catalogue, t + 1, vt, t),
+					Frames_deleff(task, index, t + 1, vt, t),
+					exclusion_axioms(task, t + 1, vt, exclusion, interference, t)]
+		for family in families:
+			for clause in family:
+				yield clause
 
 
+########################################################################################################################
+# Template-and-shift unrolling: the transition relation is built once for step 0 -> 1 and every
+# other step is obtained by adding t * vt.stride to each variable id. Without vectorised integer
+# arithmetic the shift costs more per literal than transition_clauses spends building the clause,
+# so it is only the default where nothing else can be used (split_encoding).
+
+def step_template(task, catalogue, index, vt, exclusion='pairwise', interference=None):
+	"""Preconditions, effects, frames and mutexes of the step 0 -> 1 as lists of int literals."""
+	clauses = []
+	for op in catalogue:
+		a = vt.action(op.name, 0)
+		for p in op.preconditions:
+			clauses.append([-a, vt.fact(p, 0)])
+		for e in op.add_effects:
+			clauses.append([-a, vt.fact(e, 1)])
+		for e in op.del_effects:
+			clauses.append([-a, -vt.fact(e, 1)])
+
+	for p in sorted(vt.fact_index[convert_to_symbolic(i)] for i in task.facts):
+		# Also for facts without adders / deleters, which then keep their value.
+		clauses.append([vt.fact_var(p, 0), -vt.fact_var(p, 1)] + [vt.action_var(k, 0) for k in index.adders[p]])
+		clauses.append([-vt.fact_var(p, 0), vt.fact_var(p, 1)] + [vt.action_var(k, 0) for k in index.deleters[p]])
+
+	clauses.extend(exclusion_axioms(task, 1, vt, exclusion, interference))
+	return clauses
+
+
+FlatTemplate = namedtuple('FlatTemplate', ['literals', 'signs'])
+
+
+def flatten(template):
+	"""The template as one flat, 0-terminated array of literals plus the sign (-1, 0, 1) of each.
+
+	Unrolling a flattened template only adds the offset of each step, so
+	flatten once and unroll it as often as needed.
+	"""
+	if isinstance(template, FlatTemplate):
+		return template
+	flat = array('i')
+	for clause in template:
+		flat.extend(clause)
+		flat.append(0)
+	return FlatTemplate(flat, array('i', [(l > 0) - (l < 0) for l in flat]))
+
+
+def unroll(template, vt, horizon, start=0):
+	"""Instantiate the (flattened) template for every t in start..horizon-1 into one flat, 0-terminated buffer."""
+	flat, signs = flatten(template)
+	buf = array('i')
+	for t in range(start, horizon):
+		off = t * vt.stride
+		buf.extend([l + s * off for l, s in zip(flat, signs)])
+	return buf
+
+
+def iter_clauses(buf):
+	clause = []
+	for l in buf:
+		if l:
+			clause.append(l)
+		else:
+			yield clause
+			clause = []
+
+
+def unrolled_steps(template, vt, horizon):
+	"""Stream the template step by step; only one step of the buffer is alive at a time."""
+	template = flatten(template)
+	for t in range(horizon):
+		for clause in iter_clauses(unroll(template, vt, t + 1, start=t)):
+			yield clause
 
 
+########################################################################################################################
+# Reachability pruning: a fact that is not in layer t of the planning graph cannot be true at step t,
+# and an action that is not in layer t cannot be executed at step t. Those variables are fixed to
+# false and every clause is simplified accordingly, whichever family produced it.
+
+class Reachability:
+	"""Facts and actions of vt reachable at every step, from the planning graph of the task.
+
+	The graph is expanded until it levels off; every step after the last level
+	looks like that level. With `mutex` the fact mutexes of every level are
+	kept too, as pairs (i, j), i < j, of fact indices. They hold for sequential
+	and forall steps only: an exists step may execute two actions that are
+	mutex in the graph one after the other, so they must not be used with it.
+	"""
+
+	def __init__(self, task, vt, mutex=False):
+		self.vt = vt
+		self.facts = []
+		self.actions = []
+		self.mutexes = []
+		for level in PlanningGraph(task, mutex).build():
+			facts = {vt.fact_index[convert_to_symbolic(f)] for f in level.getFactLayer().getFacts()}
+			actions = {vt.action_index[convert_to_symbolic(op.name)] for op in level.getActionLayer().getActions()}
+			self.facts.append([i for i in range(len(vt.facts)) if i not in facts])
+			self.actions.append([j for j in range(len(vt.actions)) if j not in actions])
+			pairs = {tuple(sorted(vt.fact_index[convert_to_symbolic(f)] for f in pair))
+					 for pair in level.getFactLayer().getMutexFacts()}
+			self.mutexes.append(sorted(pairs))
+		self._false = [set(i) for i in self.facts], [set(j) for j in self.actions]
+
+	def unreachable(self, var):
+		"""True if the fact or action behind variable `var` can never be true at its step."""
+		t, i = divmod(abs(var) - 1, self.vt.stride)
+		t = min(t, len(self.facts) - 1)
+		if i < len(self.vt.facts):
+			return i in self._false[0][t]
+		i -= len(self.vt.facts)
+		return i < len(self.vt.actions) and i in self._false[1][t]
+
+	def units(self, horizon, start=0):
+		"""Unit clauses fixing the unreachable actions of steps start..horizon-1 and facts of start+1..horizon.
+
+		The facts of step 0 are already fixed by init_states.
+		"""
+		last = len(self.facts) - 1
+		for t in range(start, horizon):
+			for j in self.actions[min(t, last)]:
+				yield [-self.vt.action_var(j, t)]
+			for i in self.facts[min(t + 1, last)]:
+				yield [-self.vt.fact_var(i, t + 1)]
+
+	def mutex_clauses(self, horizon, start=0):
+		"""Binary clauses forbidding the mutex facts of steps start+1..horizon to be true together."""
+		last = len(self.facts) - 1
+		for t in range(start + 1, horizon + 1):
+			for i, j in self.mutexes[min(t, last)]:
+				yield [-self.vt.fact_var(i, t), -self.vt.fact_var(j, t)]
+
+	def prune(self, clauses):
+		"""Drop the clauses satisfied by the unit clauses and strip their false literals from the others."""
+		unreachable = self.unreachable
+		for clause in clauses:
+			if any(l < 0 and unreachable(l) for l in clause):
+				continue
+			yield [l for l in clause if l < 0 or not unreachable(l)]
+
+
+class Relevance:
+	"""Facts and actions of vt that can still contribute to the goal at every step 0..vt.horizon.
+
+	Regression from the goal: the facts relevant at the horizon are the goals,
+	the actions relevant at step t are those adding a fact relevant at t+1, and
+	the facts relevant at t are those of t+1 plus the preconditions of the
+	actions relevant at t. Dropping the irrelevant actions from a plan leaves a
+	plan, so they are fixed to false, and the clauses mentioning an irrelevant
+	fact are left out. With `reach` (a Reachability) only the actions reachable
+	at t can be relevant at t.
+	"""
+
+	def __init__(self, task, catalogue, index, vt, reach=None):
+		self.vt = vt
+		preconditions = [[vt.fact_index[p] for p in op.preconditions] for op in catalogue]
+		relevant = frozenset(vt.fact_index[convert_to_symbolic(g)] for g in task.goals)
+		self.facts = [relevant]
+		self.actions = []
+		for t in reversed(range(vt.horizon)):
+			actions = {a for p in relevant for a in index.adders[p]}
+			if reach:
+				actions = {a for a in actions if not reach.unreachable(vt.action_var(a, t))}
+			relevant = relevant.union(*[preconditions[a] for a in actions])
+			self.facts.append(relevant)
+			self.actions.append(frozenset(actions))
+		self.facts.reverse()
+		self.actions.reverse()
+
+	def irrelevant(self, var):
+		t, i = divmod(abs(var) - 1, self.vt.stride)
+		if i < len(self.vt.facts):
+			return i not in self.facts[t]
+		i -= len(self.vt.facts)
+		return i < len(self.vt.actions) and i not in self.actions[t]
+
+	def units(self, start=0):
+		"""Unit clauses fixing the irrelevant actions of steps start..horizon-1."""
+		for t in range(start, self.vt.horizon):
+			for j in range(len(self.vt.actions)):
+				if j not in self.actions[t]:
+					yield [-self.vt.action_var(j, t)]
+
+	def prune(self, clauses):
+		"""Leave out the clauses mentioning an irrelevant fact, simplify the others by the units."""
+		facts = len(self.vt.facts)
+		irrelevant = self.irrelevant
+		for clause in clauses:
+			if any(irrelevant(l) and (l < 0 or (abs(l) - 1) % self.vt.stride < facts) for l in clause):
+				continue
+			yield [l for l in clause if l < 0 or not irrelevant(l)]
 
 
+########################################################################################################################
+# Multi-process encoding: the timesteps of the per-step families do not depend on each other, so
+# contiguous ranges of them are encoded by a process pool and joined back in timestep order.
+
+_step_state = None
+
+
+def _init_step_worker(state):
+	global _step_state
+	_step_state = state
+
+
+def _encode_step_range(bounds):
+	task, catalogue, index, vt, exclusion, interference, pruners = _step_state
+	start, end = bounds
+	clauses = transition_clauses(task, catalogue, index, vt, end, exclusion, interference, start)
+	for pruner in pruners:
+		clauses = pruner.prune(clauses)
+	buf = array('i')
+	for key in ClauseStore().filter(clauses):
+		buf.extend(key)
+		buf.append(0)
+	return buf
+
+
+def parallel_steps(task, catalogue, index, horizon, vt, exclusion='pairwise', interference=None, workers=None,
+				   pruners=()):
+	"""All per-step families of every timestep, encoded by `workers` processes.
+
+	Each worker runs its range of timesteps through `pruners` (Reachability,
+	Relevance), brings the clauses to canonical form and drops the duplicates
+	among them, all of which costs more than encoding them. The ranges come
+	back in timestep order as flat, 0-terminated array('i') buffers, to hand
+	to the sinks as they are (ClauseStore.filter_buffer, the add_buffer of
+	solvers.DimacsWriter and of the backends); splitting them into clauses
+	again in this process would cost as much as encoding them serially.
+	"""
+	workers = workers or multiprocessing.cpu_count()
+	size = max(1, -(-horizon // (4 * workers)))
+	bounds = [(t, min(t + size, horizon)) for t in range(0, horizon, size)]
+	state = (task, catalogue, index, vt, exclusion, interference, list(pruners))
+	with ProcessPoolExecutor(workers, initializer=_init_step_worker, initargs=(state,)) as pool:
+		for buf in pool.map(_encode_step_range, bounds):
+			yield buf
 
 
+########################################################################################################################
+# Streaming output: families -> ClauseStore.filter (or dedup_window) -> write_kb (and its sinks).
+
+def canonical_clause(clause):
+	"""Sorted tuple of the distinct literals of a clause, or None for a tautology."""
+	key = tuple(sorted(set(clause), key=lambda l: (abs(l), l)))
+	for a, b in zip(key, key[1:]):
+		if a == -b:
+			return None
+	return key
+
+
+class ClauseStore:
+	"""Hash-consed set of clauses keyed on their canonical integer tuples.
+
+	Each distinct clause is stored once, as its canonical tuple, and a
+	duplicate is dropped the moment it is added. Iteration follows insertion
+	order, so a deterministic encoder gives a byte-for-byte reproducible KB.
+	"""
+
+	def __init__(self, clauses=()):
+		self._clauses = {}
+		for clause in clauses:
+			self.add(clause)
+
+	def add(self, clause):
+		"""Store a clause; return its canonical tuple, or None if it was already known."""
+		key = canonical_clause(clause)
+		if key is None or key in self._clauses:
+			return None
+		self._clauses[key] = key
+		return key
+
+	def filter(self, clauses):
+		"""Pass on each clause the first time it is seen, in canonical form."""
+		for clause in clauses:
+			key = self.add(clause)
+			if key is not None:
+				yield key
+
+	def filter_buffer(self, buf):
+		"""Same as filter, for a flat, 0-terminated buffer of clauses already in canonical form.
+
+		The clauses are only hashed, not brought to canonical form again.
+		"""
+		clauses = self._clauses
+		for clause in iter_clauses(buf):
+			key = tuple(clause)
+			if key not in clauses:
+				clauses[key] = key
+				yield key
+
+	def __contains__(self, clause):
+		return canonical_clause(clause) in self._clauses
+
+	def __iter__(self):
+		return iter(self._clauses)
+
+	def __len__(self):
+		return len(self._clauses)
+
+
+def dedup_window(clauses, size=1 << 16):
+	"""Drop clauses already seen among the last `size` distinct clauses.
+
+	Memory is bounded by the window, not by the KB. Duplicates from the encoder
+	are produced close to each other (same step, same family), which is what the
+	window catches.
+	"""
+	recent = OrderedDict()
+	for clause in clauses:
+		key = tuple(clause)
+		if key in recent:
+			recent.move_to_end(key)
+			continue
+		recent[key] = None
+		if len(recent) > size:
+			recent.popitem(last=False)
+		yield clause
+
+
+def write_kb(clauses, path, vt, buffer_size=1 << 20, sinks=()):
+	"""Write clauses to `path` as they arrive and return how many were written.
+
+	Every clause is also added to each of `sinks` (a solvers.DimacsWriter, a
+	solver backend), so that all outputs are filled in the same pass.
+	"""
+	written = 0
+	with open(path, 'w', buffering=buffer_size) as the_file:
+		for clause in clauses:
+			the_file.write(vt.text(clause) + ' ')
+			for sink in sinks:
+				sink.add_clause(clause)
+			written += 1
+	return written
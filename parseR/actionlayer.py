@@ -25,8 +25,8 @@ class ActionLayer(object):
     for act in self.actions:
       for p in act.add_effects:
         if p not in self.actions_for_prop:
-          self.actions_for_prop[p] = list()
-          self.actions_for_prop[p].add(act)
+          self.actions_for_prop[p] = set()
+        self.actions_for_prop[p].add(act)
 
   def addAction(self, act):
     """Add an action to the layer 
@@ -36,9 +36,9 @@ class ActionLayer(object):
     """
     self.actions.add(act)
     for p in act.add_effects:
-        if p not in self.actions_for_prop:
-          self.actions_for_prop[p] = set()
-          self.actions_for_prop[p].add(act)
+      if p not in self.actions_for_prop:
+        self.actions_for_prop[p] = set()
+      self.actions_for_prop[p].add(act)
 
     
     
@@ -49,7 +49,7 @@ class ActionLayer(object):
         act (:class:`task.Operator`): The action to remove
     """
 
-    self.actions.erase(act)
+    self.actions.remove(act)
     self._update_actions_for_prop()
     
   def getActions(self):
@@ -0,0 +1,179 @@
+""" On-disk cache of grounded tasks
+
+Parsing and grounding the same domain and problem again for every horizon
+or encoder option is wasted time. A TaskCache keeps the grounded task.Task
+under a key hashed from the contents of both PDDL files, the grounding
+options, the source of the grounder and CACHE_VERSION, so editing either
+file or the grounder leads to a new entry instead of a stale one.
+
+Entries are zlib-compressed pickles of plain tuples of strings, written
+atomically. Every hit refreshes the modification time of its entry, and
+after every write the least recently used entries are evicted until the
+cache fits in max_size bytes.
+
+Example::
+
+    from tools import parse_pddl
+    task = parse_pddl('domain.pddl', 'problem.pddl', cache='.task_cache')
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import zlib
+
+from task import FactTable, Task, Operator
+
+# Bump whenever the layout of an entry changes
+CACHE_VERSION = 1
+
+MAGIC = b'PDDLTASK'
+SUFFIX = '.task'
+
+
+def _grounder_digest():
+    """Hash of the source of the parser and grounder, which determines the grounded task."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = os.path.join(here, 'pddl')
+    paths = [os.path.join(here, 'grounding.py'), os.path.join(here, 'task.py')]
+    paths += [os.path.join(parser, name) for name in sorted(os.listdir(parser))
+              if name.endswith('.py')]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pack(task):
+    """Return the task as compressed bytes of plain tuples."""
+    operators = tuple((op.name, tuple(sorted(op.preconditions)),
+                       tuple(sorted(op.add_effects)),
+                       tuple(sorted(op.del_effects)))
+                      for op in task.operators)
+    data = (task.name, tuple(sorted(task.facts)),
+            tuple(sorted(task.initial_state)), tuple(sorted(task.goals)),
+            operators)
+    return zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+
+def _unpack(blob):
+    """Rebuild the task packed by _pack."""
+    name, facts, init, goals, operators = pickle.loads(zlib.decompress(blob))
+    fact_table = FactTable(facts)
+    return Task(name, set(facts), frozenset(init), frozenset(goals),
+                [Operator(*op, fact_table) for op in operators])
+
+
+class TaskCache:
+    """A directory of grounded tasks with least recently used eviction.
+
+    Attributes:
+        directory (:obj:`string`): Where the entries are stored
+        max_size (:obj:`int`): Upper bound of the total size of the entries in bytes
+    """
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self._grounder = _grounder_digest()
+
+    def key(self, domain_file, problem_file, **options):
+        """Return the key of a domain, problem and grounding options"""
+        digest = hashlib.sha256()
+        parts = [str(CACHE_VERSION), self._grounder, _file_digest(domain_file),
+                 _file_digest(problem_file), repr(sorted(options.items()))]
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def load(self, key):
+        """Return the task stored under key, or None.
+
+        An entry that cannot be read back, for instance because it was
+        written by another version or got truncated, is removed.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                header = file.readline()
+                blob = file.read()
+        except OSError:
+            return None
+        try:
+            if header != self._header(key):
+                raise ValueError('stale header')
+            task = _unpack(blob)
+        except Exception as err:
+            logging.warning('Removing stale cache entry {0}: {1}'.format(path, err))
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return task
+
+    def store(self, key, task):
+        """Store the task under key and evict the oldest entries if the cache got too big."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(self._header(key))
+                file.write(_pack(task))
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_size."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            logging.info('Evicting cache entry {0}'.format(name))
+            self._remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        """Remove every entry"""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(SUFFIX):
+                    self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _header(key):
+        return MAGIC + b' %d %s\n' % (CACHE_VERSION, key.encode())
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
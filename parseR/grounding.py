@@ -22,16 +22,16 @@ task.
 
 import logging
 import itertools
-import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
-from task import Task, Operator
+from task import FactTable, Task, Operator
 
 # controls mass log output
 verbose_logging = False
 
 
-def ground(problem):
+def ground(problem, forward=False, workers=None):
     """
     This is the main method that grounds the PDDL task and returns an
     instance of the task.Task class.
@@ -39,6 +39,11 @@ def ground(problem):
     @note Assumption: only PDDL problems with types at the moment.
 
     @param problem A pddl.Problem instance describing the parsed problem
+    @param forward Only ground the operators reachable from the initial
+                   state when ignoring delete effects, see
+                   _ground_actions_forward
+    @param workers Number of processes grounding the actions, see
+                   _ground_actions; the forward grounding ignores it
     @return A task.Task instance with the grounded problem
     """
 
@@ -74,8 +79,21 @@ def ground(problem):
     if verbose_logging:
         logging.debug("Initial state with statics:\n%s" % init)
 
-    # Ground actions
-    operators = _ground_actions(actions, type_map, statics, init)
+    # Index the static facts of the initial state by predicate, position and object
+    static_index = _create_static_index(init, statics)
+    # and as one table of argument tuples per static predicate
+    static_tables = _create_static_tables(init, statics)
+
+    # Ground actions, with one fact table for all operators, so that their
+    # masks can be combined before the task is created
+    fact_table = FactTable()
+    if forward:
+        operators = _ground_actions_forward(actions, type_map, statics, init,
+                                            fact_table)
+    else:
+        operators = _ground_actions(actions, type_map, statics, init,
+                                    static_index, static_tables, fact_table,
+                                    workers)
     if verbose_logging:
         logging.debug('Operators:\n%s' % '\n'.join(map(str, operators)))
 
@@ -89,7 +107,7 @@ def ground(problem):
         logging.debug("Goal:\n%s" % goals)
 
     # Collect facts from operators and include the ones from the goal
-    facts = _collect_facts(operators) | goals
+    facts = _collect_facts(operators, fact_table) | goals
     if verbose_logging:
         logging.debug("All grounded facts:\n%s" % facts)
 
@@ -99,13 +117,14 @@ def ground(problem):
         logging.debug("Initial state without statics:\n%s" % init)
 
     # perform relevance analysis
-    operators = _relevance_analysis(operators, goals)
+    operators = _relevance_analysis(operators, goals, fact_table)
 
     name = problem.name
-    return Task(name, facts, init, goals, operators)
+    task = Task(name, facts, init, goals, operators)
+    return task
 
 
-def _relevance_analysis(operators, goals):
+def _relevance_analysis(operators, goals, fact_table):
     """This implements a relevance analysis of operators.
 
     We start with all facts within the goal and iteratively compute
@@ -113,48 +132,40 @@ def _relevance_analysis(operators, goals):
     Relevant effects are those that contribute to a valid path to the goal.
     """
     debug = True
-    debug_pruned_op = set()
+    debug_pruned_op = 0
 
-    relevant_facts = set()
-    old_relevant_facts = set()
+    # The facts are bitmasks over fact_table from here on
+    relevant_facts = fact_table.to_mask(goals)
     changed = True
-    for goal in goals:
-        relevant_facts.add(goal)
 
     while changed:
         # set next relevant facts to current facts
         # if we do not add anything in the following for loop
         # we have already found a fixpoint
-        old_relevant_facts = relevant_facts.copy()
+        old_relevant_facts = relevant_facts
         # compute cut of relevant facts with effects of all operators
         for op in operators:
-            new_addlist = op.add_effects & relevant_facts
-            new_dellist = op.del_effects & relevant_facts
-            if new_addlist or new_dellist:
+            if (op.add_mask | op.del_mask) & relevant_facts:
                 # add all preconditions to relevant facts
-                relevant_facts |= op.preconditions
+                relevant_facts |= op.pre_mask
         changed = old_relevant_facts != relevant_facts
 
     # delete all irrellevant effects
     del_operators = set()
     for op in operators:
-        # calculate new effects
-        new_addlist = op.add_effects & relevant_facts
-        new_dellist = op.del_effects & relevant_facts
         if debug:
-            debug_pruned_op |= op.add_effects - relevant_facts
-            debug_pruned_op |= op.del_effects - relevant_facts
+            debug_pruned_op |= (op.add_mask | op.del_mask) & ~relevant_facts
         # store new effects
-        op.add_effects = new_addlist
-        op.del_effects = new_dellist
-        if not new_addlist and not new_dellist:
+        op.add_mask &= relevant_facts
+        op.del_mask &= relevant_facts
+        if not op.add_mask and not op.del_mask:
             if verbose_logging:
                 logging.debug('Relevance analysis removed oparator %s' %
                               op.name)
             del_operators.add(op)
     if debug:
         logging.info('Relevance analysis removed %d facts' %
-                     len(debug_pruned_op))
+                     bin(debug_pruned_op).count('1'))
     # remove completely irrelevant operators
     return [op for op in operators if not op in del_operators]
 
@@ -206,18 +217,19 @@ def _create_type_map(objects):
     return type_map
 
 
-def _collect_facts(operators):
+def _collect_facts(operators, fact_table):
     """
     Collect all facts from grounded operators (precondition, add
-    effects and delete effects).
+    effects and delete effects), whose masks are over fact_table.
     """
-    facts = set()
+    facts = 0
     for op in operators:
-        facts |= op.preconditions | op.add_effects | op.del_effects
-    return facts
+        facts |= op.pre_mask | op.add_mask | op.del_mask
+    return set(fact_table.to_facts(facts))
 
 
-def _ground_actions(actions, type_map, statics, init):
+def _ground_actions(actions, type_map, statics, init, static_index,
+                    static_tables, fact_table, workers=None):
     """
     Ground a list of actions and return the resulting list of operators.
 
@@ -225,48 +237,271 @@ def _ground_actions(actions, type_map, statics, init):
     @param type_map: Mapping from type to objects of that type
     @param statics: Names of the static predicates
     @param init: Grounded initial state
+    @param static_index: Index of the static facts in init, see
+                         _create_static_index
+    @param static_tables: Static facts in init per predicate, see
+                          _create_static_tables
+    @param fact_table: task.FactTable of the operators
+    @param workers: If more than one, the assignment spaces of the actions
+                    are split into chunks that are grounded by this many
+                    processes, see _ground_actions_parallel
     """
-    op_lists = [_ground_action(action, type_map, statics, init)
+    if workers is not None and workers > 1:
+        return _ground_actions_parallel(actions, type_map, statics, init,
+                                        static_index, static_tables,
+                                        fact_table, workers)
+    op_lists = [_ground_action(action, type_map, statics, init, static_index,
+                               static_tables, fact_table)
                 for action in actions]
     operators = list(itertools.chain(*op_lists))
     return operators
 
 
-def _find_pred_in_init(pred_name, param, sig_pos, init):
+def _ground_actions_parallel(actions, type_map, statics, init, static_index,
+                             static_tables, fact_table, workers):
     """
-    This method is used to check whether an instantiation of the predicate
-    denoted by pred_name with the parameter param at position sig_pos is
-    present in the initial condition.
+    Ground a list of actions with a pool of worker processes.
 
-    Useful to evaluate static preconditions efficiently.
+    The static preconditions are joined here, then the assignment space of
+    every action is split into chunks, so that one large action keeps all
+    workers busy as well as many small ones. The operators come back in the
+    same order as from the sequential grounding.
     """
-    match_init = None
-    if sig_pos == 0:
-        match_init = re.compile('\(%s %s.*' % (pred_name, param))
-    else:
-        reg_ex = '\(%s\s+' % pred_name
-        reg_ex += '[\w\d-]+\s+' * sig_pos
-#        for i in xrange(sig_pos):
-#            reg_ex += '[\w\d-]+\s+'
-        reg_ex += '%s.*' % param
-        match_init = re.compile(reg_ex)
-    assert (match_init is not None)
-    return any([match_init.match(string) for string in init])
+    jobs = []
+    for action in actions:
+        logging.debug('Grounding %s' % action.name)
+        partial, domain_lists = _get_assignment_space(action, type_map,
+                                                      statics, static_index,
+                                                      static_tables)
+        for chunk in _split_assignment_space(partial, domain_lists,
+                                             4 * workers):
+            jobs.append((action,) + chunk)
+
+    operators = []
+    with ProcessPoolExecutor(workers, initializer=_init_ground_worker,
+                             initargs=((statics, init),)) as pool:
+        for records in pool.map(_ground_chunk, jobs):
+            operators.extend(Operator(*record, fact_table)
+                             for record in records)
+    return operators
 
 
-def _ground_action(action, type_map, statics, init):
+def _ground_actions_forward(actions, type_map, statics, init, fact_table):
     """
-    Ground the action and return the resulting list of operators.
+    Ground only the operators whose preconditions can be reached from the
+    initial state when delete effects are ignored.
+
+    Every fact of the initial state, and every fact added by an operator
+    created so far, is reached once: it is unified with each precondition
+    of each action in turn, and the other preconditions are joined against
+    the facts reached so far. The add effects of the new operators are
+    reached in turn, until none is left. Operators that can never be
+    applied are never created.
     """
-    logging.debug('Grounding %s' % action.name)
-    param_to_objects = {}
+    reached = defaultdict(set)
+    # The reached facts by predicate, argument position and object
+    reached_index = defaultdict(set)
+    queue = []
+
+    def reach(fact):
+        name, *args = fact[1:-1].split()
+        args = tuple(args)
+        if args not in reached[name]:
+            reached[name].add(args)
+            for sig_pos, obj in enumerate(args):
+                reached_index[(name, sig_pos, obj)].add(args)
+            queue.append((name, args))
+
+    for fact in sorted(init):
+        reach(fact)
+    domains = {action.name: _get_param_domains(action, type_map)
+               for action in actions}
+    by_predicate = defaultdict(list)
+    for action in actions:
+        for pred in action.precondition:
+            by_predicate[pred.name].append((action, pred))
+
+    operators = []
+    tried = set()
+
+    def instantiate(action, atoms, assignment):
+        def candidates(pred):
+            # Only the facts agreeing with an assigned parameter, if any
+            for sig_pos, (name, _) in enumerate(pred.signature):
+                if name in assignment:
+                    return reached_index[(pred.name, sig_pos,
+                                          assignment[name])]
+            return reached[pred.name]
+
+        param_to_objects = domains[action.name]
+        joined, partial = _join_preconditions(atoms, param_to_objects,
+                                              candidates, assignment)
+        domain_lists = [[(name, obj) for obj in objects]
+                        for name, objects in param_to_objects.items()
+                        if name not in joined]
+        for assign in partial:
+            for rest in itertools.product(*domain_lists):
+                full = dict(assign, **dict(rest))
+                key = (action.name, tuple(sorted(full.items())))
+                if key in tried:
+                    continue
+                tried.add(key)
+                op = _create_operator(action, full, statics, init,
+                                      fact_table)
+                if op is None:
+                    continue
+                operators.append(op)
+                for fact in sorted(op.add_effects):
+                    reach(fact)
+
+    # Actions without preconditions are applicable right away
+    for action in actions:
+        if not action.precondition:
+            instantiate(action, [], {})
+
+    while queue:
+        name, args = queue.pop()
+        for action, pred in by_predicate[name]:
+            # Bind the parameters of this precondition to the new fact
+            assignment = _unify(pred, args, domains[action.name])
+            if assignment is not None:
+                others = [p for p in action.precondition if p is not pred]
+                instantiate(action, others, assignment)
+    return operators
+
+
+def _unify(pred, args, param_to_objects):
+    """
+    Return the assignment of the parameters of the atom pred that turns it
+    into the fact with arguments args, or None if there is none.
+    """
+    if len(args) != len(pred.signature):
+        return None
+    assignment = {}
+    for (name, _), obj in zip(pred.signature, args):
+        if name in param_to_objects:
+            if (obj not in param_to_objects[name] or
+                    assignment.setdefault(name, obj) != obj):
+                return None
+        elif name != obj:
+            return None
+    return assignment
 
+
+def _get_param_domains(action, type_map):
+    """
+    Map every parameter of the action to the set of objects of its types.
+    """
+    param_to_objects = {}
     for param_name, param_types in action.signature:
         # List of sets of objects for this parameter
         objects = [type_map[type] for type in param_types]
         # Combine the sets into one set
         objects = set(itertools.chain(*objects))
         param_to_objects[param_name] = objects
+    return param_to_objects
+
+
+def _create_static_index(init, statics):
+    """
+    Map (predicate name, argument position, object) to the static facts of
+    the initial state that have this object at this position.
+
+    Built once, so that checking whether an instantiation of a static
+    predicate with a given object at a given position is present in the
+    initial state is a set lookup.
+    """
+    statics = set(statics)
+    static_index = defaultdict(set)
+    for fact in init:
+        name, *args = fact[1:-1].split()
+        if name in statics:
+            for sig_pos, obj in enumerate(args):
+                static_index[(name, sig_pos, obj)].add(fact)
+    return static_index
+
+
+def _create_static_tables(init, statics):
+    """
+    Map every static predicate to the argument tuples of its facts in the
+    initial state, i.e. to the table of its true instantiations.
+    """
+    static_tables = {name: [] for name in statics}
+    for fact in init:
+        name, *args = fact[1:-1].split()
+        if name in static_tables:
+            static_tables[name].append(tuple(args))
+    return static_tables
+
+
+def _join_preconditions(atoms, param_to_objects, facts, assignment=None):
+    """
+    Compute the assignments of the parameters occurring in the precondition
+    atoms that make all of them true facts.
+
+    Every atom is a table of the objects its parameters can take, restricted
+    to their domains. The tables are joined one by one, smallest first among
+    those sharing a parameter with the ones already joined, so only
+    consistent partial assignments are ever built.
+
+    @param facts Function returning the argument tuples of the true facts
+                 that may match an atom
+    @param assignment Parameters already assigned, if any
+    @return The joined parameters and a list of assignments (dicts from
+            parameter to object) of them
+    """
+    tables = []
+    for pred in atoms:
+        params = [name for name in param_to_objects
+                  if name in [var for var, _ in pred.signature]]
+        rows = set()
+        for args in facts(pred):
+            row = _unify(pred, args, param_to_objects)
+            if row is not None:
+                rows.add(tuple(row[param] for param in params))
+        tables.append((params, rows))
+
+    joined = list(assignment or {})
+    assignments = [dict(assignment or {})]
+    while tables and assignments:
+        tables.sort(key=lambda table: (bool(joined) and
+                                       not set(table[0]) & set(joined),
+                                       len(table[1])))
+        params, rows = tables.pop(0)
+        shared = [param for param in params if param in joined]
+        # hash join on the parameters already assigned
+        index = defaultdict(list)
+        for row in rows:
+            index[tuple(obj for param, obj in zip(params, row)
+                        if param in joined)].append(row)
+        assignments = [dict(assign, **dict(zip(params, row)))
+                       for assign in assignments
+                       for row in index[tuple(assign[p] for p in shared)]]
+        joined += [param for param in params if param not in joined]
+    return joined, assignments
+
+
+def _ground_action(action, type_map, statics, init, static_index,
+                   static_tables, fact_table):
+    """
+    Ground the action and return the resulting list of operators.
+    """
+    logging.debug('Grounding %s' % action.name)
+    partial, domain_lists = _get_assignment_space(action, type_map, statics,
+                                                  static_index, static_tables)
+    return _ground_assignments(action, partial, domain_lists, statics, init,
+                               fact_table)
+
+
+def _get_assignment_space(action, type_map, statics, static_index,
+                          static_tables):
+    """
+    Return the possible assignments of the parameters of the action as a
+    pair (partial, domain_lists): every assignment is one of the dicts in
+    partial, joined over the static preconditions, extended by one
+    (param_name, object) tuple of each list in domain_lists.
+    """
+    param_to_objects = _get_param_domains(action, type_map)
 
     # For each parameter that is not constant,
     # remove all invalid static preconditions
@@ -286,7 +521,7 @@ def _ground_action(action, type_map, statics, init):
                     # remove if no instantiation present in initial state
                     obj_copy = objects.copy()
                     for o in obj_copy:
-                        if not _find_pred_in_init(pred.name, o, sig_pos, init):
+                        if (pred.name, sig_pos, o) not in static_index:
                             if verbose_logging:
                                 remove_debug += 1
                             objects.remove(o)
@@ -294,14 +529,33 @@ def _ground_action(action, type_map, statics, init):
         logging.info('Static precondition analysis removed %d possible objects'
                      % remove_debug)
 
+    # Join the static preconditions, instead of enumerating every
+    # combination of objects and discarding those violating them
+    static_preconditions = [pred for pred in action.precondition
+                            if pred.name in statics]
+    joined, partial = _join_preconditions(static_preconditions,
+                                          param_to_objects,
+                                          lambda pred: static_tables[pred.name])
+
     # save a list of possible assignment tuples (param_name, object)
+    # for the parameters without static preconditions
     domain_lists = [[(name, obj) for obj in objects] for name, objects in
-                    param_to_objects.items()]
+                    param_to_objects.items() if name not in joined]
+    return partial, domain_lists
+
+
+def _ground_assignments(action, partial, domain_lists, statics, init,
+                        fact_table):
+    """
+    Create the operators of the action for the assignments given by partial
+    and domain_lists, see _get_assignment_space.
+    """
     # Calculate all possible assignments
-    assignments = itertools.product(*domain_lists)
+    assignments = (tuple(assign.items()) + rest for assign in partial
+                   for rest in itertools.product(*domain_lists))
     REMOVE_EQUAL_VALUES=False
     if REMOVE_EQUAL_VALUES:
-        assignments_tmp = itertools.product(*domain_lists)
+        assignments_tmp = assignments
         assignments=[]
         for a in assignments_tmp:
             vals=set([val for (v,val) in a])
@@ -311,7 +565,7 @@ def _ground_action(action, type_map, statics, init):
             assignments.append(a)
 
     # Create a new operator for each possible assignment of parameters
-    ops = [_create_operator(action, dict(assign), statics, init)
+    ops = [_create_operator(action, dict(assign), statics, init, fact_table)
             for assign in assignments]
     # Filter out the None values
     ops = filter(bool, ops)
@@ -319,13 +573,55 @@ def _ground_action(action, type_map, statics, init):
     return ops
 
 
-def _create_operator(action, assignment, statics, init):
+def _split_assignment_space(partial, domain_lists, chunks):
+    """
+    Split the assignment space (partial, domain_lists) of an action into at
+    most chunks disjoint parts along partial, each a run of the assignments
+    in the order of the sequential grounding. While partial is shorter than
+    chunks, it is extended by the first domain list.
+    """
+    while len(partial) < chunks and domain_lists:
+        partial = [dict(assign, **{name: obj}) for assign in partial
+                   for name, obj in domain_lists[0]]
+        domain_lists = domain_lists[1:]
+    size = max(1, -(-len(partial) // chunks))
+    return [(partial[i:i + size], domain_lists)
+            for i in range(0, len(partial), size)]
+
+
+# State shared by the grounding worker processes, set once per process by
+# _init_ground_worker instead of being sent along with every chunk.
+_ground_state = None
+
+
+def _init_ground_worker(state):
+    global _ground_state
+    _ground_state = state
+
+
+def _ground_chunk(job):
+    """
+    Ground one chunk of the assignment space of an action in a worker
+    process. The operators are returned as compact records
+    (name, preconditions, add_effects, del_effects) of tuples, which are
+    cheaper to send back than the operators themselves.
+    """
+    statics, init = _ground_state
+    action, partial, domain_lists = job
+    return [(op.name, tuple(op.preconditions), tuple(op.add_effects),
+             tuple(op.del_effects))
+            for op in _ground_assignments(action, partial, domain_lists,
+                                          statics, init, FactTable())]
+
+
+def _create_operator(action, assignment, statics, init, fact_table):
     """Create an operator for "action" and "assignment".
 
     Statics are handled here. True statics aren't added to the
     precondition facts of a grounded operator. If there is a false static
     in the ungrounded precondition, the operator won't be created.
     @param assignment: mapping from predicate name to object name
+    @param fact_table: task.FactTable of the operator
     """
     precondition_facts = set()
     for precondition in action.precondition:
@@ -356,7 +652,8 @@ def _create_operator(action, assignment, statics, init):
     add_effects -= precondition_facts
     args = [assignment[name] for name, types in action.signature]
     name = _get_grounded_string(action.name, args)
-    return Operator(name, precondition_facts, add_effects, del_effects)
+    return Operator(name, precondition_facts, add_effects, del_effects,
+                    fact_table)
 
 
 def _get_grounded_string(name, args):
@@ -372,14 +669,13 @@ def _ground_atom(atom, assignment):
     """
     PRUNE_EQUAL_FACTS=True
     names = []
-    vals=set()
     for name, types in atom.signature:
         if name in assignment:
-            vals.add(assignment[name])
             names.append(assignment[name])
         else:
             names.append(name)
-    if len(atom.signature) > len(vals) and PRUNE_EQUAL_FACTS:
+    # Constants count as objects too: only atoms repeating one are pruned
+    if len(set(names)) < len(names) and PRUNE_EQUAL_FACTS:
         return None
     else:
         return _get_grounded_string(atom.name, names)
@@ -0,0 +1,136 @@
+"""Representation of a planning graph
+"""
+
+import itertools
+
+from actionlayer import ActionLayer
+from factlayer import FactLayer
+from task import Operator
+
+
+class PlanningGraphLevel(object):
+  """A level of the planning graph: the facts that can be true at step t and
+  the actions that can be applied to them.
+
+  Attributes:
+      factLayer (:class:`factlayer.FactLayer`): The facts of the level
+      actionLayer (:class:`actionlayer.ActionLayer`): The actions applicable in the fact layer
+  """
+
+  def __init__(self, facts=set()):
+    self.factLayer = FactLayer(facts)
+    self.actionLayer = ActionLayer()
+
+  def getFactLayer(self):
+    return self.factLayer
+
+  def getActionLayer(self):
+    return self.actionLayer
+
+  def __str__(self):
+    return "\tfact layer\n" + str(self.factLayer) + "\n\taction layer\n" + str(self.actionLayer)
+
+
+class PlanningGraph(object):
+  """The relaxed planning graph of a task, built forward from its initial state.
+
+  Level 0 holds the initial state; the facts of level t+1 are those of
+  level t plus the add effects of the actions of level t. Delete effects are
+  ignored, so every layer contains the one before it and the graph stops
+  growing once two fact layers are equal.
+
+  With `mutex` the Graphplan mutexes are computed as well, with a noop for
+  every fact: two actions are mutex if one deletes a precondition or an add
+  effect of the other, or if two of their preconditions are mutex; two facts
+  are mutex if every pair of actions adding them is. The graph then also
+  keeps growing until the fact mutexes stop changing.
+
+  Attributes:
+      task (:class:`task.Task`): The grounded task
+      mutex (bool): Whether the mutexes are computed
+      levels (:obj:`list`): The :class:`PlanningGraphLevel` s built so far
+  """
+
+  def __init__(self, task, mutex=False):
+    self.task = task
+    self.mutex = mutex
+    self.levels = [PlanningGraphLevel(set(task.initial_state))]
+    self._addActions(self.levels[0])
+
+  def _addActions(self, level):
+    factLayer = level.getFactLayer()
+    # One bitmask for the layer, tested against the precondition mask of every operator
+    layer = self.task.to_mask(factLayer.getFacts())
+    for op in self.task.operators:
+      if op.pre_mask & ~layer == 0:
+        level.getActionLayer().addAction(op)
+    if self.mutex:
+      actions = sorted(level.getActionLayer().getActions(), key=lambda op: op.name)
+      for act1, act2 in itertools.combinations(actions, 2):
+        if self._interfere(act1, act2, factLayer):
+          level.getActionLayer().addMutexActions(act1, act2)
+
+  @staticmethod
+  def _interfere(act1, act2, factLayer):
+    """True if act1 and act2 cannot be applied together from factLayer"""
+    if (act1.del_mask & (act2.pre_mask | act2.add_mask) or
+        act2.del_mask & (act1.pre_mask | act1.add_mask)):
+      return True
+    return any(factLayer.isMutex(p, q) for p in act1.preconditions for q in act2.preconditions)
+
+  def _addFactMutexes(self, level, last):
+    """Mark the facts of level that no two compatible actions (or noops) of last can add together"""
+    actionLayer = last.getActionLayer()
+    noops = {f: Operator('noop ' + f, {f}, {f}, (), self.task.fact_table)
+             for f in last.getFactLayer().getFacts()}
+
+    def mutex(act1, act2):
+      if act1 is act2:
+        return False
+      if act1.name.startswith('noop ') or act2.name.startswith('noop '):
+        return self._interfere(act1, act2, last.getFactLayer())
+      return actionLayer.isMutex(act1, act2)
+
+    achievers = {}
+    for f in level.getFactLayer().getFacts():
+      achievers[f] = list(actionLayer.getActionsForCondition(f)) + ([noops[f]] if f in noops else [])
+    for f, g in itertools.combinations(sorted(achievers), 2):
+      if all(mutex(a, b) for a in achievers[f] for b in achievers[g]):
+        level.getFactLayer().addMutexProp(f, g)
+
+  def expand(self):
+    """Add the next level to the graph
+
+    Returns:
+        :class:`PlanningGraphLevel`: The new level
+    """
+    last = self.levels[-1]
+    facts = set(last.getFactLayer().getFacts())
+    for act in last.getActionLayer().getActions():
+      facts.update(act.add_effects)
+    level = PlanningGraphLevel(facts)
+    if self.mutex:
+      self._addFactMutexes(level, last)
+    self._addActions(level)
+    self.levels.append(level)
+    return level
+
+  def fixedPoint(self):
+    """
+    Returns:
+        bool: True if the last two levels have the same facts (and mutexes), so that expanding further changes nothing
+    """
+    return len(self.levels) > 1 and self.levels[-1].getFactLayer() == self.levels[-2].getFactLayer()
+
+  def build(self, max_levels=None):
+    """Expand the graph until it levels off, or until it has `max_levels` levels
+
+    Returns:
+        :obj:`list`: The levels of the graph
+    """
+    while not self.fixedPoint() and (max_levels is None or len(self.levels) < max_levels):
+      self.expand()
+    return self.levels
+
+  def __str__(self):
+    return "\n".join("level {0}\n{1}".format(i, level) for i, level in enumerate(self.levels))
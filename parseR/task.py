@@ -32,59 +32,178 @@ Example::
 """
 
 
+class FactTable:
+    """Dense ids for fact names, bit i of a mask standing for names[i]
+
+    Every task has its own table (see Task), so the ids of its facts are
+    dense and freed with the task. Ids are handed out as facts are first
+    given to to_mask and never taken back: a fact that no operator uses any
+    more keeps its bit.
+    """
+    __slots__ = ('names', 'ids', '_state', '_state_mask', '_effects')
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        self._state = self._state_mask = None
+        self._effects = {}
+        self.to_mask(names)
+
+    def to_mask(self, facts) -> int:
+        """Get the bitmask of a set of fact names, giving new facts an id"""
+        ids = self.ids
+        mask = 0
+        for fact in facts:
+            i = ids.get(fact)
+            if i is None:
+                i = ids[fact] = len(self.names)
+                self.names.append(fact)
+            mask |= 1 << i
+        return mask
+
+    def to_facts(self, mask: int) -> frozenset:
+        """Get the fact names of a bitmask"""
+        names = self.names
+        facts = []
+        while mask:
+            low = mask & -mask
+            facts.append(names[low.bit_length() - 1])
+            mask ^= low
+        return frozenset(facts)
+
+    def effect_facts(self, mask: int) -> frozenset:
+        """Same as to_facts, remembering the result
+
+        For the effect masks of operators, which are applied again and again;
+        the facts of a mask are only kept once the operator is applied.
+        """
+        facts = self._effects.get(mask)
+        if facts is None:
+            facts = self._effects[mask] = self.to_facts(mask)
+        return facts
+
+    def state_mask(self, state) -> int:
+        """Same as to_mask for a state, without giving new facts an id
+
+        The mask of the last frozenset is kept, as a state is usually tested
+        against every operator in turn.
+        """
+        if state is self._state:
+            return self._state_mask
+        ids = self.ids
+        mask = 0
+        for fact in state:
+            i = ids.get(fact)
+            if i is not None:
+                mask |= 1 << i
+        if type(state) is frozenset:
+            self._state, self._state_mask = state, mask
+        return mask
+
+    def __getstate__(self):
+        return self.names
+
+    def __setstate__(self, names):
+        self.__init__(names)
+
+
 class Operator:
     """This class represents an operator (action). 
 
+    Only the bitmasks are stored, over the ids of `fact_table`; the sets of
+    fact names are derived from them on access and assigning one sets the
+    mask. Without a table the operator gets one of its own, until it is
+    given to a Task (see set_fact_table).
+
     Attributes:
 
         preconditions (:obj:`frozenset`): Represent the facts that have to be true before the operator can be applied.
         add_effects (:obj:`frozenset`): The facts that the operator makes true.  
         delete_effects (:obj:`frozenset`): The facts that the operator makes false.
+        pre_mask, add_mask, del_mask (:obj:`int`): The same as bitmasks, see :class:`FactTable`
+        fact_table (:class:`FactTable`): The ids of the masks
 
     """
-    def __init__(self, name, preconditions, add_effects, del_effects):
+    __slots__ = ('name', 'pre_mask', 'add_mask', 'del_mask', 'fact_table')
+
+    def __init__(self, name, preconditions, add_effects, del_effects,
+                 fact_table=None):
         self.name = name
-        self.preconditions = set(preconditions)
-        self.add_effects = set(add_effects)
-        self.del_effects = set(del_effects)
+        self.fact_table = table = FactTable() if fact_table is None else fact_table
+        self.pre_mask = table.to_mask(preconditions)
+        self.add_mask = table.to_mask(add_effects)
+        self.del_mask = table.to_mask(del_effects)
+
+    @property
+    def preconditions(self):
+        return self.fact_table.to_facts(self.pre_mask)
+
+    @preconditions.setter
+    def preconditions(self, facts):
+        self.pre_mask = self.fact_table.to_mask(facts)
+
+    @property
+    def add_effects(self):
+        return self.fact_table.to_facts(self.add_mask)
+
+    @add_effects.setter
+    def add_effects(self, facts):
+        self.add_mask = self.fact_table.to_mask(facts)
+
+    @property
+    def del_effects(self):
+        return self.fact_table.to_facts(self.del_mask)
+
+    @del_effects.setter
+    def del_effects(self, facts):
+        self.del_mask = self.fact_table.to_mask(facts)
+
+    def set_fact_table(self, table):
+        """Store the masks over the ids of another table"""
+        if table is not self.fact_table:
+            pre, add, dels = self.preconditions, self.add_effects, self.del_effects
+            self.fact_table = table
+            self.pre_mask = table.to_mask(pre)
+            self.add_mask = table.to_mask(add)
+            self.del_mask = table.to_mask(dels)
 
     def set_precondition(self, precond=set()):
         """Set the preconditions        
         """
         
-        self.preconditions.update(precond)
+        self.pre_mask |= self.fact_table.to_mask(precond)
     def set_add_effects(self, add_facts=set()):
         """Set the add effects    
 
         Set the facts that are added by this operator
         """
-        self.add_effects.update(add_facts)
+        self.add_mask |= self.fact_table.to_mask(add_facts)
         
     def set_del_effects(self, del_facts=set()):
         """Set the delete effects
 
         Set the facts that are removed by this operator
         """
-        self.del_effects.update(del_facts)
+        self.del_mask |= self.fact_table.to_mask(del_facts)
 
     def clear_precondition(self, precond=set()):
         """Clear the preconditions        
         """
         
-        self.preconditions = frozenset(precond)
+        self.preconditions = precond
     def clear_add_effects(self, add_facts=set()):
         """Clear the add effects    
 
         Clear the facts that are added by this operator
         """
-        self.add_effects = frozenset(add_facts)
+        self.add_effects = add_facts
         
     def clear_del_effects(self, del_facts=set()):
         """Clear the delete effects
 
         Clear the facts that are removed by this operator
         """
-        self.del_effects = frozenset(del_facts)
+        self.del_effects = del_facts
 
     def applicable(self, state: set) -> bool:
         """Check if the operator can be applied to a given state
@@ -98,7 +217,8 @@ class Operator:
         Returns: 
             True if the operator's preconditions is a subset of the state, False otherwise
         """
-        return self.preconditions <= state
+        pre = self.pre_mask
+        return self.fact_table.state_mask(state) & pre == pre
 
     def apply(self, state: set ) -> set:
         """Apply operator to a given state
@@ -120,7 +240,17 @@ class Operator:
         """
         assert self.applicable(state)
         assert type(state) in (frozenset, set)
-        return (state - self.del_effects) | self.add_effects
+        effect_facts = self.fact_table.effect_facts
+        return (state - effect_facts(self.del_mask)) | effect_facts(self.add_mask)
+
+    def applicable_mask(self, state: int) -> bool:
+        """Same as applicable, for a state given as a bitmask"""
+        return state & self.pre_mask == self.pre_mask
+
+    def apply_mask(self, state: int) -> int:
+        """Same as apply, for a state given as a bitmask"""
+        assert self.applicable_mask(state)
+        return (state & ~self.del_mask) | self.add_mask
 
     def __str__(self):
         s = '%s\n' % self.name
@@ -142,9 +272,15 @@ class Task:
     Atrributes:
         name (:obj:`string`): The task's name
         facts (:obj:`set`): A set of all the fact names that are valid in the domain
-        initial_state (:obj:`set`): A set of fact names that are true at the beginning
-        goals (:obj:`set`): A set of fact names that must be true to solve the problem
+        initial_state (:obj:`frozenset`): A set of fact names that are true at the beginning
+        goals (:obj:`frozenset`): A set of fact names that must be true to solve the problem
         operators(:obj:`set`): A set of :class:`task.Operator` representing the valid actions in the problem
+        fact_table (:class:`FactTable`): Dense ids of the facts, in sorted order
+        initial_mask (:obj:`int`): The initial state as a bitmask over fact_table
+        goal_mask (:obj:`int`): The goals as a bitmask
+
+    The operators are moved to fact_table (see Operator.set_fact_table), so
+    an operator belongs to the last task it was given to.
 
     """
     def __init__(self, name, facts, initial_state, goals, operators):
@@ -153,9 +289,45 @@ class Task:
         """
         self.name = name
         self.facts = facts
+        self.fact_table = FactTable(sorted(facts))
         self.initial_state = initial_state
         self.goals = goals
         self.operators = operators
+        for op in operators:
+            op.set_fact_table(self.fact_table)
+
+    @property
+    def initial_state(self):
+        return self.fact_table.to_facts(self.initial_mask)
+
+    @initial_state.setter
+    def initial_state(self, facts):
+        self.initial_mask = self.fact_table.to_mask(facts)
+
+    @property
+    def goals(self):
+        return self.fact_table.to_facts(self.goal_mask)
+
+    @goals.setter
+    def goals(self, facts):
+        self.goal_mask = self.fact_table.to_mask(facts)
+
+    def to_mask(self, facts) -> int:
+        """Get the bitmask of a set of fact names"""
+        return self.fact_table.to_mask(facts)
+
+    def to_facts(self, mask: int) -> frozenset:
+        """Get the fact names of a bitmask"""
+        return self.fact_table.to_facts(mask)
+
+    def goal_reached_mask(self, state: int) -> bool:
+        """Same as goal_reached, for a state given as a bitmask"""
+        return state & self.goal_mask == self.goal_mask
+
+    def get_successor_masks(self, state: int) -> list:
+        """Same as get_successor_states, for a state given as a bitmask"""
+        return [(op, (state & ~op.del_mask) | op.add_mask)
+                for op in self.operators if state & op.pre_mask == op.pre_mask]
 
     def goal_reached(self, state: set) -> bool:
         """Check if the goal has been reached at a given state
@@ -169,7 +341,8 @@ class Task:
         Returns:
             True if all the goals are reached, False otherwise
         """
-        return self.goals <= state
+        goals = self.goal_mask
+        return self.fact_table.state_mask(state) & goals == goals
 
     def get_successor_states(self, state: set) -> list:
         """Get the successor states from a given state
@@ -185,8 +358,11 @@ class Task:
             A list with (op, new_state) pairs where "op" is the applicable operator (instance of task.Operator) and "new_state" the state that results when "op" is applied in state "state".
 
         """
-        return [(op, op.apply(state)) for op in self.operators
-                if op.applicable(state)]
+        state_mask = self.fact_table.state_mask(state)
+        effect_facts = self.fact_table.effect_facts
+        return [(op, (state - effect_facts(op.del_mask)) | effect_facts(op.add_mask))
+                for op in self.operators
+                if state_mask & op.pre_mask == op.pre_mask]
 
     def copy(self):
         """Get a deep copy of the task 
@@ -25,13 +25,43 @@ import sys
 import traceback
 from pddl.parser import Parser
 import grounding
+from cache import TaskCache
 
-def parse_pddl(domain_file, problem_file):
+def parse_pddl(domain_file, problem_file, forward=False, workers=None,
+               cache=None):
+    """Parse and ground the PDDL files into a task.Task.
+
+    With forward only the operators reachable from the initial state are
+    grounded, and with workers > 1 the actions are grounded by that many
+    processes, see grounding.ground.
+
+    With cache (a directory or a cache.TaskCache) the grounded task is
+    loaded from there if the same files were grounded with the same options
+    before, and stored there otherwise.
+    """
+    if cache is not None:
+        if not isinstance(cache, TaskCache):
+            cache = TaskCache(cache)
+        key = cache.key(domain_file, problem_file, forward=forward)
+        task = cache.load(key)
+        if task is not None:
+            logging.info('Loaded grounded task from cache {0}'.format(key))
+            return task
     problem = _parse(domain_file, problem_file)
-    task = _ground(problem)
+    task = _ground(problem, forward, workers)
+    if cache is not None:
+        cache.store(key, task)
     return task
 
 
+def parse_problem(domain_file, problem_file):
+    """Parse the PDDL files without grounding them.
+
+    Returns the pddl.Problem, for encodings that work on the action schemas.
+    """
+    return _parse(domain_file, problem_file)
+
+
 def _parse(domain_file, problem_file):
     # Parsing
     parser = Parser(domain_file, problem_file)
@@ -47,9 +77,9 @@ def _parse(domain_file, problem_file):
     return problem
 
 
-def _ground(problem):
+def _ground(problem, forward=False, workers=None):
     logging.info('Grounding start: {0}'.format(problem.name))
-    task = grounding.ground(problem)
+    task = grounding.ground(problem, forward, workers)
     logging.info('Grounding end: {0}'.format(problem.name))
     logging.info('{0} Variables created'.format(len(task.facts)))
     logging.info('{0} Operators created'.format(len(task.operators)))
@@ -0,0 +1,133 @@
+from itertools import chain
+import logging
+import sys
+
+
+from new_Encoder_breakdown_rules import (Reachability, Relevance, convert_to_symbolic, effect_index, flatten,
+										 goal_state, task_catalogue, init_states, interference_pairs, iter_clauses,
+										 make_var_table, step_template, transition_clauses, unroll, unrolled_steps)
+from parseR.tools import parse_pddl
+from solvers import Z3Backend
+
+
+def decode_plan(vt, model, horizon):
+	"""Read the actions that are true at each step 0..horizon-1 out of a model (set of true variables)."""
+	plan = []
+	for t in range(horizon):
+		for j, name in enumerate(vt.actions):
+			if vt.action_var(j, t) in model:
+				plan.append((t, name))
+	return plan
+
+
+def plan_for_horizon(task, catalogue, horizon, exclusion='pairwise', semantics='sequential', backend=None,
+					 timeout=None, reachable=True, mutexes=True, relevant=True, template=False):
+	"""Encode and solve the KB of one fixed horizon.
+
+	With `template` the steps are shifted copies of one step template (see
+	unroll) instead of being encoded one by one, which is slower in pure Python.
+
+	With `reachable` the KB is pruned to the facts and actions of the planning
+	graph (see Reachability), and with `mutexes` as well its fact mutexes are
+	added as binary clauses, except with semantics 'exists' (see Reachability). With `relevant` the facts and actions that cannot
+	contribute to the goal of this horizon are left out (see Relevance).
+
+	Returns (result, plan): result is True, False or None (timeout) as given by
+	the backend, plan is the decoded plan when result is True.
+	"""
+	interference = None if semantics == 'sequential' else interference_pairs(catalogue, semantics)
+	vt = make_var_table(task, catalogue, horizon, exclusion if interference is None else 'pairwise')
+	index = effect_index(catalogue, vt)
+	if template:
+		steps = unrolled_steps(step_template(task, catalogue, index, vt, exclusion, interference), vt, horizon)
+	else:
+		steps = transition_clauses(task, catalogue, index, vt, horizon, exclusion, interference)
+
+	clauses = [goal_state(task, horizon, vt), init_states(task, vt), steps]
+	reach = None
+	if reachable:
+		reach = Reachability(task, vt, mutexes and semantics != 'exists')
+		clauses = [reach.prune(c) for c in clauses] + [reach.units(horizon), reach.mutex_clauses(horizon)]
+	if relevant:
+		relevance = Relevance(task, catalogue, index, vt, reach)
+		clauses = [relevance.prune(c) for c in clauses] + [relevance.units()]
+
+	backend = backend or Z3Backend()
+	for family in clauses:
+		backend.add_clauses(family)
+	result = backend.solve(timeout=timeout)
+	return result, decode_plan(vt, backend.model(), horizon) if result else None
+
+
+def incremental_plan(task, catalogue, max_horizon=30, exclusion='pairwise', semantics='sequential', backend=None,
+					 reachable=True, mutexes=True, template=False):
+	"""Find the shortest plan by deepening the horizon inside one solver session.
+
+	Step h only adds the transition clauses of step h-1 -> h. The goal at
+	horizon h is guarded by a selector variable and only enabled through an
+	assumption, so everything the solver learned at h stays valid at h+1.
+	The backend defaults to an in-process z3 solver, the only one that keeps
+	its state between calls; any other backend works but re-solves from scratch.
+
+	With semantics 'forall' or 'exists' several non-interfering actions may
+	share a step (see interference_pairs); the plan then lists them in
+	catalogue order within each step.
+
+	With `reachable` each new step is pruned to the facts and actions of the
+	planning graph (see Reachability), and with `mutexes` as well the fact
+	mutexes of the new step are added, except with semantics 'exists'. Relevance pruning depends on the
+	horizon, so it is not available here; see plan_for_horizon. `template` is
+	as in plan_for_horizon.
+
+	Returns (horizon, plan) or None if there is no plan up to max_horizon.
+	"""
+	interference = None if semantics == 'sequential' else interference_pairs(catalogue, semantics)
+	vt = make_var_table(task, catalogue, max_horizon, exclusion if interference is None else 'pairwise')
+	index = effect_index(catalogue, vt)
+	if template:
+		template = flatten(step_template(task, catalogue, index, vt, exclusion, interference))
+	goals = [vt.fact_index[convert_to_symbolic(g)] for g in task.goals]
+	reach = Reachability(task, vt, mutexes and semantics != 'exists') if reachable else None
+
+	backend = backend or Z3Backend()
+	backend.add_clauses(init_states(task, vt))
+	for h in range(max_horizon + 1):
+		if h > 0:
+			if template:
+				step = iter_clauses(unroll(template, vt, h, start=h - 1))
+			else:
+				step = transition_clauses(task, catalogue, index, vt, h, exclusion, interference, start=h - 1)
+			if reach:
+				step = chain(reach.prune(step), reach.units(h, start=h - 1), reach.mutex_clauses(h, start=h - 1))
+			backend.add_clauses(step)
+
+		# Selectors live above the ids of the largest horizon.
+		selector = vt.num_vars() + h + 1
+		backend.add_clauses([-selector, vt.fact_var(g, h)] for g in goals)
+		result = backend.solve([selector])
+		logging.info('Horizon {0}: {1}'.format(h, {True: 'sat', False: 'unsat', None: 'unknown'}[result]))
+		if result:
+			return h, decode_plan(vt, backend.model(), h)
+		# The goal is unreachable in h steps, so the guard can be switched off for good.
+		backend.add_clause([-selector])
+	return None
+
+
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s',
+						stream=sys.stdout)
+	domain, problem = sys.argv[1], sys.argv[2]
+	max_horizon = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+	exclusion = sys.argv[4] if len(sys.argv) > 4 else 'pairwise'
+	semantics = sys.argv[5] if len(sys.argv) > 5 else 'sequential'
+
+	task = parse_pddl(domain, problem)
+	catalogue = task_catalogue(task)
+	solution = incremental_plan(task, catalogue, max_horizon, exclusion, semantics)
+	if solution is None:
+		logging.warning('No plan up to horizon {0}'.format(max_horizon))
+	else:
+		horizon, plan = solution
+		logging.info('Plan found: length={0}'.format(horizon))
+		for t, name in plan:
+			print(t, name)
@@ -0,0 +1,111 @@
+"""Simplification of an integer clause set before it is written out or solved.
+
+Every step keeps the KB equivalent: a variable fixed by unit propagation
+keeps its unit clause, so models (and decoded plans) are unchanged.
+
+Example::
+
+	store, report = preprocess(store)
+	write_kb(store, 'KB.txt', vt)
+"""
+
+from collections import OrderedDict, defaultdict
+import logging
+
+from new_Encoder_breakdown_rules import ClauseStore
+
+
+def propagate_units(clauses, report):
+	"""Fix the literal of every unit clause, drop the clauses it satisfies and strip it from the others.
+
+	Units produced by stripping are propagated in turn. Returns the remaining
+	clauses, led by one unit clause per fixed variable, or [()] if propagation
+	ran into a conflict.
+	"""
+	clauses = [list(c) for c in clauses]
+	if any(not c for c in clauses):
+		return [()]
+	occurs = defaultdict(list)
+	for k, clause in enumerate(clauses):
+		for l in clause:
+			occurs[l].append(k)
+	alive = [True] * len(clauses)
+	value = {}
+	queue = [c[0] for c in clauses if len(c) == 1]
+	satisfied = stripped = 0
+	conflict = False
+
+	while queue:
+		l = queue.pop()
+		if value.get(abs(l)) == l:
+			continue
+		if value.get(abs(l)) == -l:
+			conflict = True
+			break
+		value[abs(l)] = l
+		for k in occurs[l]:
+			if alive[k]:
+				alive[k] = False
+				satisfied += len(clauses[k]) > 1
+		for k in occurs[-l]:
+			if alive[k]:
+				clauses[k].remove(-l)
+				stripped += 1
+				if len(clauses[k]) == 1:
+					queue.append(clauses[k][0])
+
+	report['fixed variables'] = len(value)
+	report['satisfied clauses'] = satisfied
+	report['false literals'] = stripped
+	if conflict:
+		return [()]
+	return [[l] for l in sorted(value.values(), key=abs)] + [c for c, a in zip(clauses, alive) if a]
+
+
+def remove_subsumed(clauses, report):
+	"""Drop every clause that contains all the literals of another one, shortest clauses first."""
+	clauses = [frozenset(c) for c in clauses]
+	if frozenset() in clauses:
+		report['subsumed clauses'] = len(clauses) - 1
+		return [()]
+	occurs = defaultdict(list)
+	for k, clause in enumerate(clauses):
+		for l in clause:
+			occurs[l].append(k)
+	removed = [False] * len(clauses)
+
+	for k in sorted(range(len(clauses)), key=lambda k: len(clauses[k])):
+		if removed[k]:
+			continue
+		clause = clauses[k]
+		# Every clause subsumed by this one contains its rarest literal.
+		rarest = min(clause, key=lambda l: len(occurs[l]))
+		for m in occurs[rarest]:
+			if m != k and not removed[m] and len(clauses[m]) >= len(clause) and clause <= clauses[m]:
+				removed[m] = True
+
+	report['subsumed clauses'] = sum(removed)
+	return [c for c, r in zip(clauses, removed) if not r]
+
+
+PREPROCESSING_STEPS = OrderedDict([
+	('units', propagate_units),
+	('subsumption', remove_subsumed),
+])
+
+
+def preprocess(clauses, steps=('units', 'subsumption')):
+	"""Run the given steps in order over the clauses.
+
+	Returns (ClauseStore, report); report maps what each step removed to how
+	much of it, plus the clause counts before and after.
+	"""
+	clauses = list(clauses)
+	report = OrderedDict([('clauses before', len(clauses))])
+	for step in steps:
+		clauses = PREPROCESSING_STEPS[step](clauses, report)
+	store = ClauseStore(clauses)
+	report['clauses after'] = len(store)
+	for what, n in report.items():
+		logging.info('{0:>18}: {1}'.format(what, n))
+	return store, report
@@ -0,0 +1,208 @@
+"""Portfolio scheduler that solves several horizons of one task in parallel.
+
+Every horizon is encoded and solved in its own worker process
+(planner.plan_for_horizon). Which horizons run, and how the CPUs are shared
+between them, depends on the strategy:
+
+	fixed      the given horizons, `workers` at a time in increasing order
+	geometric  horizons start, start*ratio, start*ratio**2, ... up to max_horizon
+	rintanen   every horizon 0..max_horizon, a sliding window of them time-sliced
+	           so that horizon i gets a share of the CPU proportional to
+	           gamma**i (Rintanen's algorithm B)
+
+As soon as a horizon is satisfiable every job on a longer horizon is
+cancelled; as soon as one is unsatisfiable every shorter one is cancelled
+too, since with empty steps allowed a plan of length n is also one of
+length n+1.
+"""
+
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import signal
+import sys
+import time
+
+
+from new_Encoder_breakdown_rules import task_catalogue
+from parseR.tools import parse_pddl
+from planner import plan_for_horizon
+from solvers import make_backend
+
+
+def fixed_horizons(horizons):
+	return sorted(set(horizons))
+
+
+def geometric_horizons(max_horizon, start=1, ratio=1.5):
+	horizons = []
+	h = float(start)
+	while int(round(h)) <= max_horizon:
+		if not horizons or int(round(h)) != horizons[-1]:
+			horizons.append(int(round(h)))
+		h *= ratio
+	return horizons
+
+
+def _worker(h, task, catalogue, options, conn):
+	# Own process group, so that stopping or killing the job also reaches an external SAT binary.
+	os.setpgrp()
+	try:
+		backend = make_backend(options.get('solver', 'z3'))
+		result, plan = plan_for_horizon(task, catalogue, h, options.get('exclusion', 'pairwise'),
+										options.get('semantics', 'sequential'), backend,
+										reachable=options.get('reachable', True), mutexes=options.get('mutexes', True),
+										relevant=options.get('relevant', True), template=options.get('template', False))
+	except Exception:
+		logging.exception('Horizon {0} failed'.format(h))
+		result, plan = None, None
+	conn.send((result, plan))
+	conn.close()
+
+
+class _Job:
+	# Each job reports through its own pipe: a job killed or stopped half-way
+	# cannot hold a lock that the others need, as it could with a shared Queue.
+	def __init__(self, h, process, conn, weight):
+		self.h = h
+		self.process = process
+		self.conn = conn
+		self.weight = weight
+		self.cpu = 0.0
+		self.running = True
+
+	def signal(self, sig):
+		try:
+			os.killpg(self.process.pid, sig)
+		except OSError:
+			pass
+
+	def pause(self):
+		if self.running:
+			self.signal(signal.SIGSTOP)
+			self.running = False
+
+	def resume(self):
+		if not self.running:
+			self.signal(signal.SIGCONT)
+			self.running = True
+
+	def cancel(self):
+		self.signal(signal.SIGKILL)
+		self.process.join()
+		self.conn.close()
+
+
+class PortfolioScheduler:
+	"""Run plan_for_horizon for several horizons in a pool of worker processes.
+
+	strategy is 'fixed' (uses `horizons`), 'geometric' (uses `start` and
+	`ratio`) or 'rintanen' (uses `gamma`, `window` and `quantum` seconds).
+	options are passed on to every job: solver, exclusion, semantics,
+	reachable, mutexes, relevant, template.
+	"""
+
+	def __init__(self, task, catalogue, strategy='rintanen', max_horizon=30, workers=None, horizons=None,
+				 start=1, ratio=1.5, gamma=0.8, window=None, quantum=0.1, **options):
+		self.task = task
+		self.catalogue = catalogue
+		self.strategy = strategy
+		self.workers = workers or multiprocessing.cpu_count()
+		self.gamma = gamma
+		self.quantum = quantum
+		self.options = options
+		if strategy == 'fixed':
+			self.horizons = fixed_horizons(horizons or range(max_horizon + 1))
+		elif strategy == 'geometric':
+			self.horizons = geometric_horizons(max_horizon, start, ratio)
+		elif strategy == 'rintanen':
+			self.horizons = list(range(max_horizon + 1))
+		else:
+			raise ValueError('Unknown strategy: {}'.format(strategy))
+		# Only the time-sliced strategy keeps more jobs alive than there are CPUs.
+		self.window = window or (2 * self.workers if strategy == 'rintanen' else self.workers)
+
+	def _start(self, h):
+		conn, child_conn = multiprocessing.Pipe(duplex=False)
+		process = multiprocessing.Process(target=_worker,
+										  args=(h, self.task, self.catalogue, self.options, child_conn))
+		process.daemon = True
+		process.start()
+		child_conn.close()
+		return _Job(h, process, conn, self.gamma ** h)
+
+	def _schedule(self, jobs):
+		"""Let the `workers` jobs that are furthest behind their CPU share run, pause the others."""
+		if self.strategy != 'rintanen':
+			return
+		jobs = sorted(jobs.values(), key=lambda job: job.cpu / job.weight)
+		for job in jobs[self.workers:]:
+			job.pause()
+		for job in jobs[:self.workers]:
+			job.resume()
+
+	def run(self):
+		"""Return (horizon, plan) for the shortest satisfiable horizon found, or None."""
+		pending = list(self.horizons)
+		jobs = {}
+		best = None
+		try:
+			while pending or jobs:
+				while pending and len(jobs) < self.window:
+					h = pending.pop(0)
+					jobs[h] = self._start(h)
+				self._schedule(jobs)
+
+				tick = time.time()
+				ready = wait([job.conn for job in jobs.values()], timeout=self.quantum)
+				elapsed = time.time() - tick
+				for job in jobs.values():
+					if job.running:
+						job.cpu += elapsed
+				if not ready:
+					continue
+
+				job = [job for job in jobs.values() if job.conn is ready[0]][0]
+				h = job.h
+				try:
+					result, plan = job.conn.recv()
+				except EOFError:
+					result, plan = None, None
+				jobs.pop(h).cancel()
+				logging.info('Horizon {0}: {1}'.format(h, {True: 'sat', False: 'unsat', None: 'unknown'}[result]))
+				if result:
+					best = (h, plan) if best is None or h < best[0] else best
+					cancelled = [k for k in jobs if k > h]
+					pending = [k for k in pending if k < h]
+				elif result is False:
+					cancelled = [k for k in jobs if k < h]
+					pending = [k for k in pending if k > h]
+				else:
+					cancelled = []
+				for k in cancelled:
+					logging.info('Cancelling horizon {0}'.format(k))
+					jobs.pop(k).cancel()
+		finally:
+			for job in jobs.values():
+				job.cancel()
+		return best
+
+
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s',
+						stream=sys.stdout)
+	domain, problem = sys.argv[1], sys.argv[2]
+	strategy = sys.argv[3] if len(sys.argv) > 3 else 'rintanen'
+	max_horizon = int(sys.argv[4]) if len(sys.argv) > 4 else 30
+
+	task = parse_pddl(domain, problem)
+	catalogue = task_catalogue(task)
+	solution = PortfolioScheduler(task, catalogue, strategy, max_horizon).run()
+	if solution is None:
+		logging.warning('No plan found up to horizon {0}'.format(max_horizon))
+	else:
+		horizon, plan = solution
+		logging.info('Plan found: length={0}'.format(horizon))
+		for t, name in plan:
+			print(t, name)
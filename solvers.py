@@ -0,0 +1,276 @@
+"""SAT solver backends for the integer clauses produced by the encoder.
+
+Every backend takes clauses as lists of DIMACS-style integer literals and,
+after a satisfiable solve(), returns its model as the set of variables that
+are true. The encoder never has to know which solver is used.
+
+Example::
+
+	backend = make_backend('auto')
+	backend.add_clauses(store)
+	if backend.solve():
+		plan = decode_plan(vt, backend.model(), h)
+"""
+
+from array import array
+import logging
+import os
+import subprocess
+import tempfile
+
+from new_Encoder_breakdown_rules import iter_clauses
+from parseR.tools import command_available
+
+
+def parse_model(lines):
+	"""Parse solver output into (status, true variables).
+
+	Understands the SAT competition format ("s SATISFIABLE" and "v ..." lines)
+	as well as the result files of minisat and glucose ("SAT" followed by the
+	literals). status is True, False or None when the solver gave no answer
+	("s UNKNOWN", "INDET" or nothing at all).
+	"""
+	status = None
+	true_vars = set()
+	for line in lines:
+		line = line.strip()
+		if not line or line.startswith('c'):
+			continue
+		if line.startswith('s '):
+			line = line[2:].strip()
+		if line in ('SATISFIABLE', 'SAT'):
+			status = True
+			continue
+		if line in ('UNSATISFIABLE', 'UNSAT'):
+			status = False
+			continue
+		if line in ('UNKNOWN', 'INDET', 'INDETERMINATE'):
+			status = None
+			continue
+		if line.startswith('v '):
+			line = line[2:]
+		for l in line.split():
+			l = int(l)
+			if l > 0:
+				true_vars.add(l)
+	return status, true_vars
+
+
+class DimacsWriter:
+	"""Write clauses to a DIMACS CNF file as they arrive.
+
+	The clause count of the problem line is only known at the end, so the
+	line is written padded and filled in by close(). Takes clauses like a
+	backend (add_clause / add_clauses), so it can sit next to one.
+	"""
+
+	def __init__(self, path, num_vars, comments=(), buffer_size=1 << 20):
+		self.num_vars = num_vars
+		self.written = 0
+		self._file = open(path, 'w', buffering=buffer_size)
+		for line in comments:
+			self._file.write('c {}\n'.format(line))
+		self._header = self._file.tell()
+		self._file.write(self._problem_line())
+
+	def _problem_line(self):
+		# Room for any clause count, so the final line overwrites the first one in place.
+		return 'p cnf {} {:<20}\n'.format(self.num_vars, self.written)
+
+	def add_clause(self, clause):
+		self._file.write(' '.join(map(str, clause)) + ' 0\n' if clause else '0\n')
+		self.written += 1
+
+	def add_clauses(self, clauses):
+		for clause in clauses:
+			self.add_clause(clause)
+
+	def add_buffer(self, buf):
+		"""Write a flat, 0-terminated buffer of clauses without splitting it into clauses."""
+		# 0 only ever stands alone as a terminator, so ' 0' marks the end of every clause.
+		text = (' ' + ' '.join(map(str, buf))).replace(' 0', ' 0\n').replace('\n ', '\n')
+		self._file.write(text[1:])
+		self.written += buf.count(0)
+
+	def close(self):
+		"""Fill in the clause count and close the file; return the number of clauses."""
+		if not self._file.closed:
+			self._file.seek(self._header)
+			self._file.write(self._problem_line())
+			self._file.close()
+		return self.written
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def write_dimacs(clauses, path, num_vars, comments=()):
+	"""Write clauses as a DIMACS CNF file and return the number of clauses."""
+	with DimacsWriter(path, num_vars, comments) as writer:
+		writer.add_clauses(clauses)
+	return writer.written
+
+
+class SolverBackend:
+	"""Common interface of all backends."""
+	name = None
+
+	def add_clause(self, clause):
+		raise NotImplementedError
+
+	def add_clauses(self, clauses):
+		for clause in clauses:
+			self.add_clause(clause)
+
+	def add_buffer(self, buf):
+		"""Add the clauses of a flat, 0-terminated buffer (see parallel_steps)."""
+		self.add_clauses(iter_clauses(buf))
+
+	def solve(self, assumptions=(), timeout=None):
+		"""Return True (sat), False (unsat) or None (timeout / no answer)."""
+		raise NotImplementedError
+
+	def model(self):
+		"""The set of true variables of the last satisfiable solve()."""
+		return self._model
+
+
+class Z3Backend(SolverBackend):
+	"""In-process z3 solver; keeps its state between solve() calls, so it can be used incrementally.
+
+	The model is read straight from z3 rather than through parse_model, which
+	only handles the text output of the SAT binaries (see DimacsBackend).
+	"""
+	name = 'z3'
+
+	def __init__(self):
+		import z3
+		self._z3 = z3
+		self._solver = z3.Solver()
+		self._atoms = {}
+		self._model = set()
+
+	def _atom(self, var):
+		# One z3 constant per variable, named after its id so models map straight back.
+		atom = self._atoms.get(var)
+		if atom is None:
+			atom = self._atoms[var] = self._z3.Bool('x{}'.format(var))
+		return atom
+
+	def _lit(self, lit):
+		return self._atom(lit) if lit > 0 else self._z3.Not(self._atom(-lit))
+
+	def add_clause(self, clause):
+		lits = [self._lit(l) for l in clause]
+		self._solver.add(lits[0] if len(lits) == 1 else self._z3.Or(lits))
+
+	def solve(self, assumptions=(), timeout=None):
+		z3 = self._z3
+		# z3 takes the timeout in ms; its default (no limit) is 2**32 - 1.
+		self._solver.set('timeout', int(timeout * 1000) if timeout is not None else 4294967295)
+		result = self._solver.check([self._lit(l) for l in assumptions])
+		if result == z3.unknown:
+			return None
+		if result == z3.unsat:
+			return False
+		model = self._solver.model()
+		# The atoms are named x<id>, see _atom.
+		self._model = {int(d.name()[1:]) for d in model.decls() if z3.is_true(model[d])}
+		return True
+
+
+# name: (command used to detect the binary, command line to solve a DIMACS file, result file argument?)
+SAT_SOLVERS = [
+	('kissat', ['kissat', '--version'], ['kissat', '-q'], False),
+	('cadical', ['cadical', '--version'], ['cadical', '-q'], False),
+	('cryptominisat5', ['cryptominisat5', '--version'], ['cryptominisat5', '--verb=0'], False),
+	('lingeling', ['lingeling', '--version'], ['lingeling', '-q'], False),
+	('glucose', ['glucose', '--help'], ['glucose', '-verb=0'], True),
+	('minisat', ['minisat', '--help'], ['minisat', '-verb=0'], True),
+	('picosat', ['picosat', '--version'], ['picosat'], False),
+]
+
+
+class DimacsBackend(SolverBackend):
+	"""Write the clauses as DIMACS and run a locally installed SAT binary on them.
+
+	The binary is restarted from scratch on every solve(); assumptions are
+	passed as unit clauses.
+	"""
+
+	def __init__(self, name):
+		entry = [s for s in SAT_SOLVERS if s[0] == name]
+		if not entry:
+			raise ValueError('Unknown SAT solver: {}'.format(name))
+		self.name, _, self._command, self._result_file = entry[0]
+		self._clauses = array('i')
+		self._num_vars = 0
+		self._model = set()
+
+	def add_clause(self, clause):
+		self._clauses.extend(clause)
+		self._clauses.append(0)
+		self._num_vars = max([self._num_vars] + [abs(l) for l in clause])
+
+	def add_buffer(self, buf):
+		# Kept flat as it is, the binary reads it from the DIMACS file anyway.
+		self._clauses.extend(buf)
+		if buf:
+			self._num_vars = max(self._num_vars, max(buf), -min(buf))
+
+	def solve(self, assumptions=(), timeout=None):
+		fd, cnf = tempfile.mkstemp(suffix='.cnf')
+		os.close(fd)
+		out = cnf[:-4] + '.out'
+		try:
+			num_vars = max([self._num_vars] + [abs(l) for l in assumptions])
+			with DimacsWriter(cnf, num_vars) as writer:
+				writer.add_buffer(self._clauses)
+				writer.add_clauses([l] for l in assumptions)
+			command = self._command + [cnf] + ([out] if self._result_file else [])
+			logging.debug('Running {0}'.format(' '.join(command)))
+			try:
+				proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+									  universal_newlines=True, timeout=timeout)
+			except subprocess.TimeoutExpired:
+				return None
+			if self._result_file and os.path.exists(out):
+				with open(out) as result:
+					status, true_vars = parse_model(result)
+			else:
+				status, true_vars = parse_model(proc.stdout.splitlines())
+		finally:
+			for path in (cnf, out):
+				if os.path.exists(path):
+					os.remove(path)
+		if status:
+			self._model = true_vars
+		return status
+
+
+def available_backends():
+	"""Names of the backends usable here: 'z3' if installed, then every SAT binary found on the PATH."""
+	names = []
+	try:
+		import z3
+		names.append('z3')
+	except ImportError:
+		pass
+	names.extend(name for name, check, _, _ in SAT_SOLVERS if command_available(check))
+	return names
+
+
+def make_backend(name='auto'):
+	"""Create a backend by name; 'auto' prefers an external SAT binary and falls back to z3."""
+	if name == 'auto':
+		available = available_backends()
+		external = [n for n in available if n != 'z3']
+		if not available:
+			raise RuntimeError('No SAT solver available')
+		name = external[0] if external else available[0]
+	if name == 'z3':
+		return Z3Backend()
+	return DimacsBackend(name)
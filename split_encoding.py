@@ -0,0 +1,242 @@
+"""Operator-splitting (lifted) encoding of a parsed, ungrounded PDDL problem.
+
+The ground encoding has one variable per ground action and step, so a schema
+with k parameters over n objects costs n**k of them. Here every action schema
+gets one variable per step, and every parameter one variable per object it
+can take (one-hot), so the schema costs one variable plus n per parameter.
+A precondition or an effect is encoded over the parameters of its own atom
+only: its clauses grow with the arity of the predicate, not of the action.
+Actions never get grounded, only the facts do.
+
+Facts keep the layout and the names of the ground encoding (VarTable), so the
+template unrolling, the clause store, write_kb and the solver backends work
+unchanged. Steps are sequential: at most one schema per step.
+
+Example::
+
+	encoding = SplitEncoding(parse_problem(domain, problem), h)
+	clauses = chain(encoding.goal_state(), encoding.init_state(),
+					unrolled_steps(encoding.step_template(), encoding.vt, h))
+"""
+
+from collections import OrderedDict, defaultdict
+from itertools import chain, count, product
+
+from new_Encoder_breakdown_rules import AMO_ENCODINGS, VarTable, amo_size, convert_to_symbolic
+
+
+def _symbol(name, args):
+	return convert_to_symbolic('({})'.format(' '.join([name] + list(args))))
+
+
+def _sorted_atoms(atoms):
+	"""The atoms of a precondition or effect list (a set in the parser), in a fixed order."""
+	return sorted(atoms, key=lambda atom: (atom.name, [n for n, _ in atom.signature]))
+
+
+def _objects_by_type(objects):
+	"""Map every type to the objects of it and of its subtypes."""
+	type_map = defaultdict(set)
+	for name, object_type in objects.items():
+		while object_type is not None:
+			type_map[object_type].add(name)
+			object_type = object_type.parent
+	return type_map
+
+
+class SplitEncoding:
+	"""Step template, initial state and goal of the split encoding of `problem` up to `horizon`.
+
+	The variable table holds the ground facts, then per schema its variable
+	followed by its argument variables (named SCHEMA_PARAM_OBJECT), then the
+	auxiliaries: one per effect binding of two or more parameters, used by the
+	frame axioms, and those of the at-most-one encoding `exclusion`.
+
+	Like the grounding, a binding that gives two parameters of one atom the
+	same object is ruled out, static preconditions are checked against the
+	initial state, and a fact both added and deleted by an action is added.
+	"""
+
+	def __init__(self, problem, horizon, exclusion='pairwise'):
+		domain = problem.domain
+		objects = dict(problem.objects)
+		objects.update(domain.constants)
+		type_map = _objects_by_type(objects)
+
+		def objects_of(types):
+			return sorted(set(chain(*[type_map[t] for t in types])))
+
+		self.exclusion = exclusion
+		self.schemas = [domain.actions[name] for name in sorted(domain.actions)]
+		self.params = [OrderedDict((param, k) for k, (param, _) in enumerate(a.signature)) for a in self.schemas]
+		self.domains = [[objects_of(types) for _, types in a.signature] for a in self.schemas]
+		fluents = {atom.name for a in self.schemas for atom in chain(a.effect.addlist, a.effect.dellist)}
+		self.statics = {pred for pred in domain.predicates if pred not in fluents}
+		self.init = {_symbol(atom.name, [n for n, _ in atom.signature]) for atom in problem.initial_state}
+		self.goals = sorted((atom.name, _symbol(atom.name, [n for n, _ in atom.signature])) for atom in problem.goal)
+
+		facts = []
+		for name in sorted(fluents):
+			for args in product(*[objects_of(types) for _, types in domain.predicates[name].signature]):
+				if len(set(args)) == len(args):
+					facts.append(_symbol(name, args))
+		known_facts = set(facts)
+		facts += sorted(g for name, g in self.goals if name in fluents and g not in known_facts)
+
+		step_vars = []
+		for a, domains in zip(self.schemas, self.domains):
+			step_vars.append(_symbol(a.name, []))
+			for (param, _), objs in zip(a.signature, domains):
+				step_vars += [_symbol(a.name, [param.lstrip('?'), o]) for o in objs]
+
+		# Auxiliaries: the effect bindings first, in a fixed order, then the at-most-one encodings.
+		self.joint = sorted({(s, binding) for s, a in enumerate(self.schemas)
+							 for atom in chain(a.effect.addlist, a.effect.dellist)
+							 for _, binding, _ in self._bindings(s, atom) if len(binding) > 1})
+		aux = len(self.joint) + amo_size(exclusion, len(self.schemas))[1]
+		aux += sum(amo_size(exclusion, len(objs))[1] for domains in self.domains for objs in domains)
+		self.vt = VarTable(facts, step_vars, horizon, aux)
+
+	def _bindings(self, s, atom):
+		"""Every grounding of atom in schema s, as (fact symbol, ((parameter index, object), ...), arguments).
+
+		Atoms naming one parameter twice have no grounding.
+		"""
+		args = [name for name, _ in atom.signature]
+		params = [name for name in self.params[s] if name in args]
+		if len(params) != len([name for name in args if name in self.params[s]]):
+			return
+		ks = [self.params[s][name] for name in params]
+		for objs in product(*[self.domains[s][k] for k in ks]):
+			binding = dict(zip(params, objs))
+			ground = [binding.get(name, name) for name in args]
+			if len(set(ground)) == len(ground):
+				yield _symbol(atom.name, ground), tuple(zip(ks, objs)), ground
+
+	def schema_var(self, s, t=0):
+		return self.vt.action(_symbol(self.schemas[s].name, []), t)
+
+	def arg_var(self, s, k, obj, t=0):
+		param = self.schemas[s].signature[k][0]
+		return self.vt.action(_symbol(self.schemas[s].name, [param.lstrip('?'), obj]), t)
+
+	def _guard(self, s, binding):
+		# Negated literals of "schema s runs with this binding"; an argument implies its schema.
+		return [-self.arg_var(s, k, o) for k, o in binding] or [-self.schema_var(s)]
+
+	def step_template(self):
+		"""All clauses of the step 0 -> 1 as lists of int literals, to unroll like the ground template."""
+		vt = self.vt
+		clauses = []
+		joint = {key: vt.aux_var(i, 0) for i, key in enumerate(self.joint)}
+		aux = count(len(self.joint))
+		fresh = lambda: vt.aux_var(next(aux), 0)
+		amo = AMO_ENCODINGS[self.exclusion]
+		adders = defaultdict(list)
+		deleters = defaultdict(list)
+
+		def applied(s, binding):
+			# A literal that is true iff schema s runs with this binding.
+			if not binding:
+				return self.schema_var(s)
+			if len(binding) == 1:
+				return self.arg_var(s, *binding[0])
+			return joint[(s, binding)]
+
+		for (s, binding), d in sorted(joint.items()):
+			for k, o in binding:
+				clauses.append([-d, self.arg_var(s, k, o)])
+
+		for s, a in enumerate(self.schemas):
+			schema = self.schema_var(s)
+			# Exactly one object per parameter when the schema runs, none otherwise.
+			for k, objs in enumerate(self.domains[s]):
+				args = [self.arg_var(s, k, o) for o in objs]
+				clauses.append([-schema] + args)
+				clauses.extend([-x, schema] for x in args)
+				clauses.extend(amo(args, fresh))
+
+			precondition, addlist, dellist = map(_sorted_atoms, (a.precondition, a.effect.addlist, a.effect.dellist))
+			atoms = precondition + addlist + dellist
+			unequal = set()
+			for atom in atoms:
+				names = [name for name, _ in atom.signature if name in self.params[s]]
+				if len(set(names)) < len(names):
+					clauses.append([-schema])
+				for p, q in product(names, names):
+					if self.params[s][p] < self.params[s][q]:
+						unequal.add((self.params[s][p], self.params[s][q]))
+			for k, l in sorted(unequal):
+				for o in sorted(set(self.domains[s][k]) & set(self.domains[s][l])):
+					clauses.append([-self.arg_var(s, k, o), -self.arg_var(s, l, o)])
+
+			for atom in precondition:
+				for fact, binding, _ in self._bindings(s, atom):
+					if atom.name in self.statics:
+						if fact not in self.init:
+							clauses.append(self._guard(s, binding))
+					elif fact in vt.fact_index:
+						clauses.append(self._guard(s, binding) + [vt.fact(fact, 0)])
+					else:
+						clauses.append(self._guard(s, binding))
+
+			for atom in addlist:
+				for fact, binding, _ in self._bindings(s, atom):
+					clauses.append(self._guard(s, binding) + [vt.fact(fact, 1)])
+					adders[fact].append(applied(s, binding))
+
+			for atom in dellist:
+				for fact, binding, ground in self._bindings(s, atom):
+					deleters[fact].append(applied(s, binding))
+					# The delete only holds if no add effect of the same action grounds to the same fact.
+					unless = [self._adds(s, add, ground) for add in addlist if add.name == atom.name]
+					unless = [lits for lits in unless if lits is not None]
+					if [] in unless:
+						continue
+					for lits in product(*unless):
+						clauses.append(self._guard(s, binding) + [-vt.fact(fact, 1)] + list(lits))
+
+		for i, fact in enumerate(vt.facts):
+			clauses.append([vt.fact_var(i, 0), -vt.fact_var(i, 1)] + adders[fact])
+			clauses.append([-vt.fact_var(i, 0), vt.fact_var(i, 1)] + deleters[fact])
+
+		clauses.extend(amo([self.schema_var(s) for s in range(len(self.schemas))], fresh))
+		return clauses
+
+	def _adds(self, s, atom, ground):
+		"""Argument literals under which add effect atom of schema s grounds to `ground`: None if it never does."""
+		binding = {}
+		for (name, _), o in zip(atom.signature, ground):
+			if name in self.params[s]:
+				k = self.params[s][name]
+				if o not in self.domains[s][k] or binding.get(k, o) != o:
+					return None
+				binding[k] = o
+			elif name != o:
+				return None
+		return [self.arg_var(s, k, o) for k, o in sorted(binding.items())]
+
+	def init_state(self):
+		for i, fact in enumerate(self.vt.facts):
+			yield [self.vt.fact_var(i, 0)] if fact in self.init else [-self.vt.fact_var(i, 0)]
+
+	def goal_state(self):
+		for name, goal in self.goals:
+			if name in self.statics:
+				if goal not in self.init:
+					yield []
+			elif goal in self.vt.fact_index:
+				yield [self.vt.fact(goal, self.vt.horizon)]
+			else:
+				yield []
+
+	def decode_plan(self, model):
+		"""The ground actions of a model (set of true variables), named as in the ground encoding."""
+		plan = []
+		for t in range(self.vt.horizon):
+			for s, a in enumerate(self.schemas):
+				if self.schema_var(s, t) in model:
+					args = [[o for o in objs if self.arg_var(s, k, o, t) in model][0]
+							for k, objs in enumerate(self.domains[s])]
+					plan.append((t, _symbol(a.name, args)))
+		return plan
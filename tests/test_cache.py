@@ -0,0 +1,96 @@
+"""The on-disk task cache of parseR/cache.py."""
+import os
+import shutil
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parseR'))
+
+import pytest
+
+import tools
+from cache import SUFFIX, TaskCache
+from tools import parse_pddl
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def records(task):
+	ops = sorted((op.name, sorted(op.preconditions), sorted(op.add_effects), sorted(op.del_effects))
+				 for op in task.operators)
+	return task.name, sorted(task.facts), sorted(task.initial_state), sorted(task.goals), ops
+
+
+@pytest.fixture
+def files(tmp_path):
+	"""Copies of the logistics files, so the tests can edit them."""
+	domain, problem = str(tmp_path / 'domain.pddl'), str(tmp_path / 'problem.pddl')
+	shutil.copy(os.path.join(HERE, 'logistics_domain.pddl'), domain)
+	shutil.copy(os.path.join(HERE, 'logistics.pddl'), problem)
+	return domain, problem
+
+
+@pytest.fixture
+def cache(tmp_path):
+	return TaskCache(str(tmp_path / 'cache'))
+
+
+def entries(cache):
+	return sorted(name for name in os.listdir(cache.directory) if name.endswith(SUFFIX))
+
+
+def test_hit_gives_the_same_task(files, cache, monkeypatch):
+	task = parse_pddl(*files, cache=cache)
+	assert entries(cache) == [cache.key(*files, forward=False) + SUFFIX]
+
+	def ground(*args):
+		raise AssertionError('grounded despite a cached task')
+	monkeypatch.setattr(tools, '_ground', ground)
+	cached = parse_pddl(*files, cache=cache.directory)
+	assert records(cached) == records(task)
+	assert [op.name for op in cached.operators] == [op.name for op in task.operators]
+
+
+def test_key_depends_on_content_and_options(files, cache):
+	domain, problem = files
+	key = cache.key(domain, problem, forward=False)
+	assert cache.key(domain, problem, forward=False) == key
+	assert cache.key(domain, problem, forward=True) != key
+	# Touching the file alone keeps the key, changing its content does not
+	os.utime(problem, (0, 0))
+	assert cache.key(domain, problem, forward=False) == key
+	with open(problem, 'a') as f:
+		f.write('\n; edited\n')
+	assert cache.key(domain, problem, forward=False) != key
+
+
+@pytest.mark.parametrize('damage', ['header', 'truncate'])
+def test_broken_entry_is_removed(files, cache, damage):
+	parse_pddl(*files, cache=cache)
+	key = cache.key(*files, forward=False)
+	path = os.path.join(cache.directory, key + SUFFIX)
+	with open(path, 'rb') as f:
+		header, blob = f.readline(), f.read()
+	with open(path, 'wb') as f:
+		if damage == 'header':
+			# As written by another version of the cache
+			f.write(header.replace(b' 1 ', b' 0 ', 1) + blob)
+		else:
+			f.write(header + blob[:len(blob) // 2])
+	assert cache.load(key) is None
+	assert not os.path.exists(path)
+	assert cache.load('0' * 64) is None
+
+
+def test_evict_removes_the_least_recently_used(files, cache):
+	task = parse_pddl(*files)
+	for i, key in enumerate(['a', 'b', 'c']):
+		cache.store(key, task)
+		os.utime(os.path.join(cache.directory, key + SUFFIX), (i, i))
+	size = os.path.getsize(os.path.join(cache.directory, 'a' + SUFFIX))
+	# Using an entry makes it the most recent one
+	assert cache.load('a') is not None
+	cache.max_size = 2 * size
+	cache.evict()
+	assert entries(cache) == ['a' + SUFFIX, 'c' + SUFFIX]
+	cache.max_size = size - 1
+	cache.evict()
+	assert entries(cache) == []
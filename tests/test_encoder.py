@@ -0,0 +1,132 @@
+"""Building blocks of new_Encoder_breakdown_rules.py."""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from array import array
+from itertools import chain, count, product
+
+import pytest
+
+import new_Encoder_breakdown_rules as encoder
+from new_Encoder_breakdown_rules import (AMO_ENCODINGS, ClauseStore, Reachability, Relevance, amo_size, canonical_clause,
+										 effect_index, interference_pairs, make_var_table, parallel_steps, task_catalogue,
+										 transition_clauses)
+from parseR.tools import parse_pddl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AMO_SIZES = range(0, 12)
+
+
+def amo_clauses(encoding, n):
+	"""The clauses over the literals 1..n and the auxiliary ids the encoding asked for."""
+	counter = count(n + 1)
+	aux = []
+
+	def fresh():
+		aux.append(next(counter))
+		return aux[-1]
+	return list(AMO_ENCODINGS[encoding](list(range(1, n + 1)), fresh)), aux
+
+
+def solve(clauses):
+	"""Plain DPLL, enough for the handful of auxiliaries of one at-most-one encoding."""
+	if not clauses:
+		return True
+	if any(not clause for clause in clauses):
+		return False
+	lit = min(clauses, key=len)[0]
+	for l in (lit, -lit):
+		if solve([[x for x in c if x != -l] for c in clauses if l not in c]):
+			return True
+	return False
+
+
+@pytest.mark.parametrize('encoding', sorted(AMO_ENCODINGS))
+def test_amo_allows_exactly_at_most_one(encoding):
+	for n in AMO_SIZES:
+		clauses, _ = amo_clauses(encoding, n)
+		for values in product((False, True), repeat=n):
+			fixed = {i + 1: v for i, v in enumerate(values)}
+			rest = []
+			for clause in clauses:
+				if any(fixed.get(abs(l)) == (l > 0) for l in clause):
+					continue
+				rest.append([l for l in clause if abs(l) > n])
+			assert solve(rest) == (sum(values) <= 1), (encoding, n, values)
+
+
+@pytest.mark.parametrize('encoding', sorted(AMO_ENCODINGS))
+def test_amo_size_is_exact(encoding):
+	for n in AMO_SIZES:
+		clauses, aux = amo_clauses(encoding, n)
+		assert amo_size(encoding, n) == (len(clauses), len(aux))
+		# The variable table reserves amo_size auxiliaries per step, right after the actions
+		assert aux == list(range(n + 1, n + 1 + len(aux)))
+		assert all(0 < abs(l) <= n + len(aux) for clause in clauses for l in clause)
+
+
+def test_amo_sizes_of_the_docstrings():
+	for n in range(2, 12):
+		bits = (n - 1).bit_length()
+		assert amo_size('pairwise', n) == (n * (n - 1) // 2, 0)
+		assert amo_size('sequential', n) == (3 * n - 4, n - 1)
+		assert amo_size('binary', n) == (n * bits, bits)
+
+
+def test_canonical_clause():
+	assert canonical_clause([3, -1, 2, 3, -1]) == (-1, 2, 3)
+	assert canonical_clause([-2, 2]) is None
+	assert canonical_clause([4, 1, -1, 5]) is None
+	assert canonical_clause([]) == ()
+
+
+def test_clause_store_drops_tautologies_and_duplicates():
+	store = ClauseStore([[2, 1], [-3]])
+	assert store.add([1, 2, 1]) is None
+	assert store.add([3, -3]) is None
+	assert store.add([-3, 1]) == (1, -3) and store.add([1, -3]) is None
+	assert list(store) == [(1, 2), (-3,), (1, -3)]
+	assert [2, 1, 2] in store and [3, -3] not in store
+	# The first copy of every clause passes, in canonical form and in order
+	assert list(store.filter([[5, 4], [1, 2], [4, 5, 5], [-6, 6], [-7]])) == [(4, 5), (-7,)]
+	buf = array('i', [1, 2, 0, 8, 9, 0, 8, 9, 0, -7, 0, 0])
+	assert list(store.filter_buffer(buf)) == [(8, 9), ()]
+	assert len(store) == 7
+
+
+HORIZON = 6
+
+
+@pytest.fixture(scope='module')
+def blocks():
+	return parse_pddl(os.path.join(ROOT, 'original_domain.pddl'), os.path.join(ROOT, 'prob4.pddl'))
+
+
+@pytest.mark.parametrize('semantics, exclusion', [('sequential', 'pairwise'), ('sequential', 'sequential'),
+												  ('forall', 'pairwise')])
+@pytest.mark.parametrize('pruned', [False, True])
+def test_parallel_steps_match_serial(blocks, monkeypatch, semantics, exclusion, pruned):
+	catalogue = task_catalogue(blocks)
+	interference = None if semantics == 'sequential' else interference_pairs(catalogue, semantics)
+	vt = make_var_table(blocks, catalogue, HORIZON, exclusion if interference is None else 'pairwise')
+	index = effect_index(catalogue, vt)
+	pruners = []
+	if pruned:
+		reach = Reachability(blocks, vt, True)
+		pruners = [reach, Relevance(blocks, catalogue, index, vt, reach)]
+
+	clauses = transition_clauses(blocks, catalogue, index, vt, HORIZON, exclusion, interference)
+	for pruner in pruners:
+		clauses = pruner.prune(clauses)
+	serial = list(ClauseStore().filter(clauses))
+
+	# The ranges of one worker, in this process
+	monkeypatch.setattr(encoder, '_step_state', None)
+	encoder._init_step_worker((blocks, catalogue, index, vt, exclusion, interference, pruners))
+	bufs = [encoder._encode_step_range(bounds) for bounds in [(0, 1), (1, 4), (4, HORIZON)]]
+	assert list(ClauseStore().filter_buffer(array('i', chain(*bufs)))) == serial
+
+	bufs = parallel_steps(blocks, catalogue, index, HORIZON, vt, exclusion, interference, 3, pruners)
+	assert list(chain.from_iterable(map(ClauseStore().filter_buffer, bufs))) == serial
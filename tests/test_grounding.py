@@ -0,0 +1,95 @@
+"""The grounding strategies of parseR/grounding.py against plain enumeration."""
+import itertools
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parseR'))
+
+import pytest
+
+import grounding
+from task import FactTable
+from tools import _parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBLEMS = {'blocks': (os.path.join(ROOT, 'original_domain.pddl'), os.path.join(ROOT, 'prob4.pddl')),
+			'logistics': (os.path.join(ROOT, 'tests', 'logistics_domain.pddl'),
+						  os.path.join(ROOT, 'tests', 'logistics.pddl'))}
+
+
+@pytest.fixture(params=sorted(PROBLEMS))
+def problem(request):
+	return _parse(*PROBLEMS[request.param])
+
+
+def records(operators):
+	return {(op.name, op.preconditions, op.add_effects, op.del_effects) for op in operators}
+
+
+def enumerate_operators(problem):
+	"""Every assignment of every action, filtered by _create_operator, as grounding did before the joins."""
+	domain = problem.domain
+	actions = domain.actions.values()
+	objects = dict(problem.objects, **domain.constants)
+	statics = grounding._get_statics(domain.predicates.values(), actions)
+	type_map = grounding._create_type_map(objects)
+	init = grounding._get_partial_state(problem.initial_state)
+	fact_table = FactTable()
+	operators = []
+	for action in actions:
+		domains = grounding._get_param_domains(action, type_map)
+		names = list(domains)
+		for objs in itertools.product(*[sorted(domains[name]) for name in names]):
+			op = grounding._create_operator(action, dict(zip(names, objs)), statics, init, fact_table)
+			if op is not None:
+				operators.append(op)
+	return operators, fact_table
+
+
+def ground_like(problem, operators, fact_table):
+	"""The operators after the relevance analysis of grounding.ground."""
+	goals = grounding._get_partial_state(problem.goal)
+	return grounding._relevance_analysis(operators, goals, fact_table)
+
+
+def test_join_grounding_matches_enumeration(problem):
+	expected = ground_like(problem, *enumerate_operators(problem))
+	assert records(grounding.ground(problem).operators) == records(expected)
+
+
+def test_static_precondition_with_constant():
+	task = grounding.ground(_parse(*PROBLEMS['logistics']))
+	dispatch = {op.name: op for op in task.operators if op.name.startswith('(dispatch')}
+	# road depot a is the only road from the depot; the static road is not kept
+	assert sorted(dispatch) == ['(dispatch t1 a)', '(dispatch t2 a)']
+	assert dispatch['(dispatch t1 a)'].preconditions == {'(truck-at t1 depot)'}
+
+
+def relaxed_reachable(problem, operators):
+	"""The operators applicable in the fixpoint of the initial state under the delete relaxation."""
+	reached = grounding._get_partial_state(problem.initial_state)
+	changed = True
+	while changed:
+		changed = False
+		for op in operators:
+			if op.preconditions <= reached and not op.add_effects <= reached:
+				reached |= op.add_effects
+				changed = True
+	return [op for op in operators if op.preconditions <= reached]
+
+
+def test_forward_grounding_drops_exactly_the_unreachable(problem):
+	operators, fact_table = enumerate_operators(problem)
+	reachable = relaxed_reachable(problem, operators)
+	expected = ground_like(problem, reachable, fact_table)
+	assert records(grounding.ground(problem, forward=True).operators) == records(expected)
+	if problem.name == 'deliver':
+		# Nothing reaches place d of the logistics problem
+		assert len(reachable) < len(operators)
+
+
+def test_parallel_grounding_matches_serial(problem):
+	serial = grounding.ground(problem).operators
+	parallel = grounding.ground(problem, workers=3).operators
+	# Same operators, in the same order
+	assert [op.name for op in parallel] == [op.name for op in serial]
+	assert records(parallel) == records(serial)
@@ -0,0 +1,65 @@
+"""Unit propagation and subsumption of preprocess.py."""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itertools import chain
+
+import pytest
+
+from new_Encoder_breakdown_rules import (effect_index, goal_state, init_states, make_var_table, task_catalogue,
+										 transition_clauses)
+from parseR.tools import parse_pddl
+from preprocess import preprocess, propagate_units, remove_subsumed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('clauses', [
+	[[1], [-1]],
+	[[1], [-1, 2], [-2]],  # the conflict only shows after stripping -1
+	[[1, 2], []],
+])
+def test_conflict_gives_the_empty_clause(clauses):
+	assert propagate_units(clauses, {}) == [()]
+
+
+def test_units_from_stripping_are_propagated():
+	report = {}
+	clauses = propagate_units([[1], [-1, 2], [-2, 3, 4], [-3], [3, 5, -4], [4, 6]], report)
+	# 1 gives 2, 2 and -3 leave [4], which satisfies [4, 6] and strips [3, 5, -4] to [5]
+	assert clauses == [[1], [2], [-3], [4], [5]]
+	assert report == {'fixed variables': 5, 'satisfied clauses': 1, 'false literals': 5}
+
+
+def test_subsumed_clauses_are_dropped():
+	report = {}
+	clauses = remove_subsumed([[1, 2, 3], [2, 1], [3, 2], [4, 3, 2, 1], [2, 1], [1, 4]], report)
+	assert clauses == [frozenset([1, 2]), frozenset([2, 3]), frozenset([1, 4])]
+	assert report == {'subsumed clauses': 3}
+	assert remove_subsumed([[1], [], [2]], {}) == [()]
+
+
+def blocks_kb(horizon):
+	task = parse_pddl(os.path.join(ROOT, 'original_domain.pddl'), os.path.join(ROOT, 'prob4.pddl'))
+	catalogue = task_catalogue(task)
+	vt = make_var_table(task, catalogue, horizon)
+	index = effect_index(catalogue, vt)
+	return list(chain(goal_state(task, horizon, vt), init_states(task, vt),
+					  transition_clauses(task, catalogue, index, vt, horizon)))
+
+
+@pytest.mark.parametrize('horizon, sat', [(5, False), (6, True)])
+def test_preprocess_keeps_the_result(horizon, sat):
+	solvers = pytest.importorskip('solvers')
+	pytest.importorskip('z3')
+	clauses = blocks_kb(horizon)
+	store, report = preprocess(clauses)
+	assert report['clauses after'] < report['clauses before']
+	backend = solvers.Z3Backend()
+	backend.add_clauses(store)
+	assert backend.solve() is sat
+	if sat:
+		# The model of the simplified KB is one of the original KB
+		model = backend.model()
+		assert all(any(l in model if l > 0 else -l not in model for l in c) for c in clauses)
@@ -0,0 +1,68 @@
+"""Model parsing and DIMACS output of solvers.py."""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from array import array
+
+import pytest
+
+from solvers import DimacsWriter, parse_model, write_dimacs
+
+
+def read_dimacs(path):
+	"""The comments, problem line and clauses of a DIMACS file."""
+	with open(path) as f:
+		lines = f.read().split('\n')
+	assert lines.pop() == ''
+	comments = [l[2:] for l in lines if l.startswith('c ')]
+	header = [l for l in lines if l.startswith('p ')]
+	clauses = [[int(l) for l in line.split()] for line in lines if not line.startswith(('c ', 'p '))]
+	assert all(clause[-1] == 0 and 0 not in clause[:-1] for clause in clauses)
+	return comments, header, [clause[:-1] for clause in clauses]
+
+
+def test_competition_output():
+	lines = ['c kissat', 's SATISFIABLE', 'v 1 -2 3', 'v -4 10 0']
+	assert parse_model(lines) == (True, {1, 3, 10})
+	assert parse_model(['c done', 's UNSATISFIABLE']) == (False, set())
+
+
+def test_minisat_result_file():
+	assert parse_model('SAT\n1 -2 -3 12 0\n'.splitlines()) == (True, {1, 12})
+	assert parse_model(['UNSAT']) == (False, set())
+
+
+@pytest.mark.parametrize('lines', [['s UNKNOWN'], ['INDET'], ['s INDETERMINATE'], []])
+def test_no_answer(lines):
+	assert parse_model(lines) == (None, set())
+
+
+CLAUSES = [[1, -2], [10], [-10, 20, -100], [], [3, 30, -5]]
+
+
+def test_buffer_round_trip(tmp_path):
+	path = str(tmp_path / 'kb.cnf')
+	buf = array('i')
+	for clause in CLAUSES:
+		buf.extend(clause)
+		buf.append(0)
+	with DimacsWriter(path, 100, comments=['horizon 3']) as writer:
+		writer.add_buffer(buf)
+		writer.add_clauses([[7], [-8, 9]])
+		writer.add_buffer(array('i'))
+	assert writer.written == len(CLAUSES) + 2
+	comments, header, clauses = read_dimacs(path)
+	assert comments == ['horizon 3']
+	# The padded problem line is overwritten in place, so the first clause stays intact.
+	assert header[0].split() == ['p', 'cnf', '100', str(len(CLAUSES) + 2)]
+	assert clauses == CLAUSES + [[7], [-8, 9]]
+
+
+def test_write_dimacs_matches_the_buffer(tmp_path):
+	by_clause, by_buffer = str(tmp_path / 'a.cnf'), str(tmp_path / 'b.cnf')
+	assert write_dimacs(CLAUSES, by_clause, 100) == len(CLAUSES)
+	with DimacsWriter(by_buffer, 100) as writer:
+		writer.add_buffer(array('i', [l for clause in CLAUSES for l in clause + [0]]))
+	with open(by_clause) as a, open(by_buffer) as b:
+		assert a.read() == b.read()
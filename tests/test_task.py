@@ -0,0 +1,71 @@
+"""The bitmasks of task.Operator and task.Task are the only stored representation."""
+import copy
+import os
+import pickle
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parseR'))
+
+from grounding import _relevance_analysis
+from task import FactTable, Operator, Task
+
+
+def test_mutators_keep_sets_and_masks_in_step():
+	op = Operator('op', {'p'}, {'q'}, {'p'})
+	op.set_precondition({'r'})
+	op.set_add_effects({'s'})
+	op.clear_del_effects({'q'})
+	op.add_effects = {'t'}
+	table = op.fact_table
+	assert op.preconditions == {'p', 'r'} and op.pre_mask == table.to_mask({'p', 'r'})
+	assert op.add_effects == {'t'} and op.add_mask == table.to_mask({'t'})
+	assert op.del_effects == {'q'} and table.to_facts(op.del_mask) == {'q'}
+
+
+def test_relevance_analysis_updates_the_masks():
+	table = FactTable()
+	useful = Operator('useful', {'p'}, {'g', 'junk'}, {'p'}, table)
+	useless = Operator('useless', {'p'}, {'junk'}, set(), table)
+	assert _relevance_analysis([useful, useless], {'g'}, table) == [useful]
+	assert useful.add_effects == {'g'} and useful.add_mask == table.to_mask({'g'})
+	assert useful.apply_mask(table.to_mask({'p'})) == table.to_mask({'g'})
+
+
+def test_every_task_has_dense_ids():
+	first = Task('first', {'a', 'b', 'c'}, {'a'}, {'c'}, [Operator('ab', {'a'}, {'b'}, {'a'})])
+	second = Task('second', {'x', 'y'}, {'x'}, {'y'}, [Operator('xy', {'x'}, {'y'}, {'x'})])
+	assert first.fact_table.names == ['a', 'b', 'c']
+	assert second.fact_table.names == ['x', 'y']
+	op = second.operators[0]
+	assert op.fact_table is second.fact_table
+	assert (op.pre_mask, op.add_mask, op.del_mask) == (0b01, 0b10, 0b01)
+
+
+def test_copies_keep_the_facts():
+	task = Task('t', {'p', 'q'}, {'p'}, {'q'}, [Operator('op', {'p'}, {'q'}, {'p'})])
+	for other in (pickle.loads(pickle.dumps(task)), copy.deepcopy(task)):
+		op = other.operators[0]
+		assert op.fact_table is other.fact_table
+		assert other.initial_state == {'p'} and other.goals == {'q'}
+		assert (op.preconditions, op.add_effects, op.del_effects) == ({'p'}, {'q'}, {'p'})
+		assert other.goal_reached_mask(op.apply_mask(other.initial_mask))
+
+
+def test_set_methods_agree_with_the_masks():
+	ops = [Operator('ab', {'a'}, {'b'}, {'a'}), Operator('bc', {'b'}, {'c'}, set()),
+		   Operator('ca', {'c'}, {'a'}, {'b', 'c'})]
+	task = Task('t', {'a', 'b', 'c'}, {'a'}, {'c'}, ops)
+	table = task.fact_table
+	for state in (frozenset(), frozenset('a'), frozenset('ab'), frozenset('bc'), frozenset('abc')):
+		mask = table.to_mask(state)
+		assert task.goal_reached(state) == task.goal_reached_mask(mask)
+		for op in ops:
+			assert op.applicable(state) == op.applicable_mask(mask)
+			if op.applicable(state):
+				assert op.apply(state) == table.to_facts(op.apply_mask(mask))
+		successors = task.get_successor_states(state)
+		assert [(op, table.to_mask(s)) for op, s in successors] == task.get_successor_masks(mask)
+	# A set may change between calls, so its mask is not kept:
+	state = {'a'}
+	assert ops[0].applicable(state) and not ops[1].applicable(state)
+	state.add('b')
+	assert ops[1].applicable(state)